@@ -0,0 +1,187 @@
+from __future__ import annotations
+
+import contextvars
+import json
+import os
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+from app import profiling
+from app.metrics import box_score_lookups
+from app.records import BoxScoreRecord, LeagueRecord
+from app.singleflight import SingleFlight
+from app.store import Store
+
+# upper bound on concurrent box_scores requests made by a single prefetch
+BOX_SCORE_WORKERS = int(os.environ.get("BOX_SCORE_WORKERS", "8"))
+
+# on-disk store for raw ESPN responses, an empty path turns it off
+ESPN_CACHE_PATH = os.environ.get("ESPN_CACHE_PATH", ".cache/espn.sqlite3")
+# how long responses for a season that is still being played stay fresh
+ESPN_CACHE_TTL_SECONDS = int(os.environ.get("ESPN_CACHE_TTL_SECONDS", "300"))
+
+
+class BoxScoreCache:
+    """Box scores for one loaded league, keyed by (league, season, matchup period, scoring period).
+
+    Every matchup in the league comes back from a single box_scores call, so one
+    entry serves every Services method that needs that day. Scoring periods that
+    are already final are kept for the life of the cache; the in-progress period
+    is always refetched so live scores stay live.
+    """
+
+    def __init__(self, league: LeagueRecord):
+        self.league = league
+        self._store = {}
+        # players across every stored box score, kept as entries go in so sizing the cache is free
+        self._players = 0
+        self._lock = threading.Lock()
+        # stats of several managers asking for the same period at once share one request
+        self._flight = SingleFlight()
+        self.hits = 0
+        self.misses = 0
+
+    def _key(self, matchup_period: int, scoring_period: int) -> tuple[int, int, int, int]:
+        return (self.league.league_id, self.league.year, matchup_period, scoring_period)
+
+    def is_complete(self, scoring_period: int) -> bool:
+        # scoringPeriodId runs past finalScoringPeriod once the season is over
+        if self.league.scoringPeriodId > self.league.finalScoringPeriod:
+            return True
+        return scoring_period < self.league.scoringPeriodId
+
+    def is_started(self, scoring_period: int) -> bool:
+        # days after the current one have no box scores worth fetching yet
+        return scoring_period <= self.league.scoringPeriodId
+
+    def last_complete_period(self) -> int:
+        return min(self.league.scoringPeriodId - 1, self.league.finalScoringPeriod)
+
+    def carry_over(self, previous: BoxScoreCache) -> int:
+        """Take the final periods another cache of the same league already holds, returns how many were taken"""
+        with previous._lock:
+            entries = dict(previous._store)
+        taken = 0
+        with self._lock:
+            for key, games in entries.items():
+                # a period final for the previous league is final for this later one too
+                if key[:2] == (self.league.league_id, self.league.year) and key not in self._store:
+                    # the records point at the previous league's teams, stats compare against this one's
+                    self._store[key] = [self._rebind(game) for game in games]
+                    self._players += self._count_players(games)
+                    taken += 1
+        return taken
+
+    def _rebind(self, game: BoxScoreRecord) -> BoxScoreRecord:
+        return BoxScoreRecord(self.league._team(game.home_team), self.league._team(game.away_team),
+                              game.home_score, game.away_score, game.home_lineup, game.away_lineup)
+
+    def get(self, matchup_period: int, scoring_period: int) -> list[BoxScoreRecord]:
+        key = self._key(matchup_period, scoring_period)
+        with self._lock:
+            if key in self._store:
+                self.hits += 1
+                box_score_lookups.inc(result="hit")
+                return self._store[key]
+            self.misses += 1
+        box_score_lookups.inc(result="miss")
+        return self._flight.do(key, self._fetch, key, matchup_period, scoring_period)
+
+    def _fetch(self, key: tuple[int, int, int, int], matchup_period: int, scoring_period: int) -> list[BoxScoreRecord]:
+        games = self.league.box_scores(matchup_period, scoring_period)
+
+        if self.is_complete(scoring_period):
+            with self._lock:
+                if key not in self._store:
+                    self._players += self._count_players(games)
+                self._store[key] = games
+        return games
+
+    @staticmethod
+    def _count_players(games: list[BoxScoreRecord]) -> int:
+        return sum(len(box_score.home_lineup) + len(box_score.away_lineup) for box_score in games)
+
+    def clear(self):
+        """Drop every stored period, later lookups fetch them again"""
+        with self._lock:
+            self._store.clear()
+            self._players = 0
+
+    def prefetch(self, periods, max_workers: int = None, progress=None) -> dict[tuple[int, int], list[BoxScoreRecord]]:
+        """Fetch every (matchup_period, scoring_period) pair at once and return them keyed by pair.
+
+        Pairs already in the cache are served from it, the rest are fetched in
+        parallel with at most max_workers requests in flight. progress, when
+        given, is called with (pairs fetched, total pairs) as each one lands.
+        """
+        pairs = list(dict.fromkeys(periods))
+        max_workers = max_workers or BOX_SCORE_WORKERS
+        fetched = [0]
+        progress_lock = threading.Lock()
+
+        def fetch(pair):
+            games = self.get(*pair)
+            if progress:
+                with progress_lock:
+                    fetched[0] += 1
+                    progress(fetched[0], len(pairs))
+            return games
+
+        if progress:
+            progress(0, len(pairs))
+        if len(pairs) <= 1 or max_workers <= 1:
+            return {pair: fetch(pair) for pair in pairs}
+
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(pairs)), thread_name_prefix="box_scores") as executor:
+            # each fetch runs in a copy of the caller's context so its ESPN time is billed to the caller's request
+            contexts = [contextvars.copy_context() for _ in pairs]
+            task = (lambda pair: profiling.track(fetch, pair)) if profiling.PROFILING_ENABLED else fetch
+            results = executor.map(lambda context, pair: context.run(task, pair), contexts, pairs)
+            return dict(zip(pairs, results))
+
+    def player_count(self) -> int:
+        with self._lock:
+            return self._players
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = {"entries": len(self._store), "hits": self.hits, "misses": self.misses,
+                     "last_complete_period": self.last_complete_period()}
+        return {**stats, "coalesced": self._flight.shared}
+
+
+class ResponseCache:
+    """Raw ESPN JSON responses kept compressed in a Store, so they survive restarts and redeploys.
+
+    On a SQLiteStore every worker process reads the responses the others
+    fetched. Entries written with ttl=None never expire, which is what
+    finished seasons and final scoring periods use. Everything else is stored
+    with a short TTL.
+    """
+
+    def __init__(self, store: Store):
+        self.store = store
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str):
+        body = self.store.get(key)
+        with self._lock:
+            if body is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return json.loads(zlib.decompress(body))
+
+    def set(self, key: str, value, ttl: float | None):
+        self.store.set(key, zlib.compress(json.dumps(value).encode()), ttl)
+
+    def purge_expired(self) -> int:
+        return self.store.purge_expired()
+
+    def stats(self) -> dict:
+        with self._lock:
+            counts = {"hits": self.hits, "misses": self.misses}
+        return {**self.store.stats(), **counts}
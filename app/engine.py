@@ -0,0 +1,209 @@
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from app.cache import BoxScoreCache, ESPN_CACHE_TTL_SECONDS
+from app.espn import season_complete
+from app.matrix import ScoreMatrix
+from app.records import LeagueRecord, TeamRecord
+from app.services import Services, approx_league_bytes
+from app.singleflight import SingleFlight
+from app.store import Store, shared_store
+
+# leagues kept warm at once, least recently used are dropped first
+ENGINE_MAX = int(os.environ.get("ENGINE_MAX", "50"))
+# approximate memory cap across every engine's league and box scores, least recently used are dropped first
+ENGINE_MAX_MB = int(os.environ.get("ENGINE_MAX_MB", "1024"))
+# how long a finished season's wrapped report is shared between workers before the league is swept again
+WRAPPED_SHARED_TTL_SECONDS = int(os.environ.get("WRAPPED_SHARED_TTL_SECONDS", str(7 * 24 * 3600)))
+# part of the shared report key, bump it whenever a stat's output changes so reports stored by older code are not served
+WRAPPED_REPORT_VERSION = 2
+
+
+class LeagueEngine:
+    """Everything about one league that is the same for every manager in it.
+
+    Each box_scores response already holds every matchup in the league, so the
+    engine sweeps box scores once and builds the wrapped report for all teams
+    together. Managers who show up later are served from those results, and
+    with a shared Store so are managers of the league on other workers.
+
+    An engine replacing a stale one of the same league during the season
+    starts from the previous engine's final box scores and lineup totals, so
+    it only fetches and scores the periods played since.
+    """
+
+    def __init__(self, league: LeagueRecord, shared: Store = None, previous: LeagueEngine = None):
+        self.league = league
+        self.shared = shared
+        self.box_score_cache = BoxScoreCache(league)
+        self.score_matrix = ScoreMatrix(league)
+        self.derived = {}
+        # only ever held to read or store a value, builds run outside it and are coalesced through derived_builds
+        self.derived_lock = threading.Lock()
+        self.derived_builds = SingleFlight()
+        # (matchup_period, scoring_period) -> {team_id: (actual, optimal)}, filled in by the lineup index
+        self.lineup_days = {}
+        if previous is not None:
+            self._carry_over(previous)
+        self.created_at = time.monotonic()
+        # set once the registry drops or replaces the engine, sessions still holding it move to the current one
+        self.released = False
+        self._wrapped = {}
+        # guards _wrapped, only held to read, load or store the reports
+        self._lock = threading.Lock()
+        # held for a whole sweep, so concurrent managers wait for one sweep instead of starting their own
+        self._sweep_lock = threading.Lock()
+
+    def approx_size(self) -> int:
+        return approx_league_bytes(self.league, self.box_score_cache)
+
+    def release(self):
+        """Free the box scores and derived values, for an engine the registry no longer hands out"""
+        self.released = True
+        self.box_score_cache.clear()
+        with self.derived_lock:
+            self.derived.clear()
+        self.lineup_days.clear()
+
+    def _carry_over(self, previous: LeagueEngine):
+        self.box_score_cache.carry_over(previous.box_score_cache)
+        # optimal lineups depend on the slots, a league that changed them has to score every day again
+        if previous.league.lineup_slot_counts == self.league.lineup_slot_counts:
+            # a lineup index may still be adding days to it, dict() copies it in one step
+            lineup_days = dict(previous.lineup_days)
+            self.lineup_days = {
+                period: totals for period, totals in lineup_days.items() if previous.box_score_cache.is_complete(period[1])
+            }
+
+    def services_for(self, team: TeamRecord) -> Services:
+        return Services(self.league.league_id, self.league.year, None, None, engine=self, team=team)
+
+    def wrapped_all(self, progress=None) -> dict[int, dict]:
+        """Wrapped report of every team keyed by team_id, computed on first use"""
+        with self._sweep_lock:
+            reports = self._reports()
+            if not reports:
+                views = [self.services_for(team) for team in self.league.teams]
+                self.box_score_cache.prefetch((period for view in views for period in view._wrapped_periods()),
+                                              progress=progress)
+                reports = {view.team.team_id: view.compute_wrapped() for view in views}
+                with self._lock:
+                    self._wrapped = reports
+                self._save_shared(reports)
+            return reports
+
+    def wrapped(self, team: TeamRecord, progress=None) -> dict:
+        return self.wrapped_all(progress)[team.team_id]
+
+    def precomputed(self, team: TeamRecord) -> dict | None:
+        """The team's report if the league has already been swept here or by another worker, without starting a sweep.
+
+        Reads the shared store, so call it off the event loop.
+        """
+        return self._reports().get(team.team_id)
+
+    def _reports(self) -> dict[int, dict]:
+        with self._lock:
+            if not self._wrapped:
+                self._wrapped = self._load_shared()
+            return self._wrapped
+
+    def _shared_key(self) -> str:
+        return f"wrapped:v{WRAPPED_REPORT_VERSION}:{self.league.league_id}:{self.league.year}"
+
+    def _load_shared(self) -> dict[int, dict]:
+        body = self.shared.get(self._shared_key()) if self.shared is not None else None
+        if body is None:
+            return {}
+        # JSON turns the team_id keys into strings
+        reports = {int(team_id): report for team_id, report in json.loads(body).items()}
+        # a report missing one of today's teams was swept from a different league, the league is swept again
+        if any(team.team_id not in reports for team in self.league.teams):
+            return {}
+        return reports
+
+    def _save_shared(self, reports: dict[int, dict]):
+        if self.shared is None:
+            return
+        ttl = WRAPPED_SHARED_TTL_SECONDS if season_complete(self.league.year) else ESPN_CACHE_TTL_SECONDS
+        try:
+            self.shared.set(self._shared_key(), json.dumps(reports).encode(), ttl)
+        except Exception as e:
+            print(f"Could not share wrapped reports of league {self.league.league_id}: {e}")
+
+
+class EngineRegistry:
+    """LeagueEngines keyed by (league_id, year).
+
+    Engines for a season still being played are replaced after
+    ESPN_CACHE_TTL_SECONDS so precomputed results do not go stale, and the
+    replacement picks up where the stale engine left off. Engines share their
+    wrapped reports through shared. Past max_engines, or once their leagues
+    and box scores add up to more than max_bytes, the least recently used are
+    dropped and release() frees what they hold even while sessions still
+    point at them.
+    """
+
+    def __init__(self, max_engines: int = ENGINE_MAX, ttl_seconds: int = ESPN_CACHE_TTL_SECONDS,
+                 shared: Store = None, max_bytes: int = ENGINE_MAX_MB * 1024 * 1024):
+        self.max_engines = max_engines
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.shared = shared
+        self._engines = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.evictions = 0
+
+    def _fresh(self, engine: LeagueEngine) -> bool:
+        return season_complete(engine.league.year) or time.monotonic() - engine.created_at < self.ttl_seconds
+
+    def get(self, league: LeagueRecord) -> LeagueEngine:
+        """Engine for the league, league is only used when there is no usable engine yet"""
+        key = (league.league_id, league.year)
+        with self._lock:
+            engine = self._engines.get(key)
+            if engine is not None and self._fresh(engine):
+                self.hits += 1
+                self._engines.move_to_end(key)
+                # engines grow as their box scores are fetched, so the cap is checked on every use
+                self._evict()
+                return engine
+
+            self.misses += 1
+            # a stale engine hands what is already final to its replacement
+            if engine is not None:
+                self.refreshes += 1
+            previous = engine
+            engine = LeagueEngine(league, self.shared, previous=previous)
+            if previous is not None:
+                previous.release()
+            self._engines[key] = engine
+            self._engines.move_to_end(key)
+            self._evict()
+            return engine
+
+    def _evict(self):
+        # the engine just used is last and always stays
+        total = sum(engine.approx_size() for engine in self._engines.values())
+        while len(self._engines) > 1 and (len(self._engines) > self.max_engines or total > self.max_bytes):
+            _, engine = self._engines.popitem(last=False)
+            total -= engine.approx_size()
+            engine.release()
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"engines": len(self._engines), "hits": self.hits, "misses": self.misses, "refreshes": self.refreshes,
+                    "evictions": self.evictions,
+                    "approx_mb": round(sum(engine.approx_size() for engine in self._engines.values()) / 2 ** 20, 2)}
+
+
+engines = EngineRegistry(shared=shared_store)
@@ -0,0 +1,186 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import re
+from datetime import date
+
+import requests
+from espn_api.basketball import League
+from espn_api.basketball.constant import POSITION_MAP
+from espn_api.requests.constant import FANTASY_BASE_ENDPOINT
+from espn_api.requests.espn_requests import EspnFantasyRequests, ESPNAccessDenied
+
+from app.cache import ResponseCache, ESPN_CACHE_PATH, ESPN_CACHE_TTL_SECONDS
+from app.metrics import espn_call
+from app.records import LeagueRecord
+from app.singleflight import SingleFlight
+from app.store import SQLiteStore
+from app.transport import EspnTransport, espn_transport
+
+# host serving the ESPN fantasy API, e.g. the local stand-in from bench/standin.py, empty for ESPN itself
+ESPN_BASE_URL = os.environ.get("ESPN_BASE_URL", "")
+
+# shared by every League built through build_league, and by every worker process through the SQLite file
+response_cache = ResponseCache(SQLiteStore(ESPN_CACHE_PATH, table="responses")) if ESPN_CACHE_PATH else None
+# concurrent /initialize calls for the same league and cookies wait on one League load
+league_builds = SingleFlight()
+
+
+def endpoint_label(scope: str, extend: str = '', params: dict = None) -> str:
+    """Low cardinality name of an ESPN call for metrics, e.g. league?view=mBoxscore+mMatchupScore"""
+    path = re.sub(r'\d+', ':id', extend.split('?')[0]).strip('/')
+    views = (params or {}).get('view') or []
+    views = [views] if isinstance(views, str) else views
+    label = f"{scope}/{path}" if path else scope
+    return f"{label}?view={'+'.join(views)}" if views else label
+
+
+def season_complete(year: int) -> bool:
+    # a fantasy season is named for the year its NBA regular season ends in, so nothing changes after June
+    return date.today() > date(year, 6, 30)
+
+
+class CachedEspnRequests(EspnFantasyRequests):
+    """EspnFantasyRequests that reads through the persistent response cache.
+
+    Finished seasons and scoring periods before the league's current one are
+    stored with no expiry, everything else for ESPN_CACHE_TTL_SECONDS. League
+    scoped responses are keyed by a hash of the caller's cookies so a private
+    league is only ever served to someone ESPN already let in. Misses go out
+    through the process wide keep-alive transport in app.transport.
+    """
+
+    def __init__(self, sport: str, year: int, league_id: int, cookies: dict = None, logger=None, cache: ResponseCache = None,
+                 base_url: str = ESPN_BASE_URL, transport: EspnTransport = espn_transport):
+        super().__init__(sport=sport, year=year, league_id=league_id, cookies=cookies, logger=logger)
+        if base_url:
+            base_endpoint = base_url.rstrip('/') + '/apis/v3/games/'
+            self.ENDPOINT = self.ENDPOINT.replace(FANTASY_BASE_ENDPOINT, base_endpoint)
+            self.LEAGUE_ENDPOINT = self.LEAGUE_ENDPOINT.replace(FANTASY_BASE_ENDPOINT, base_endpoint)
+        self.cache = cache
+        self.transport = transport
+        # scoring periods before this one are final, set by build_league once the league has loaded
+        self.current_scoring_period = None
+        # starting lineup slot -> count, espn_api does not keep roster settings so get_league picks them up
+        self.lineup_slot_counts = {}
+
+    def _ttl(self, params: dict = None) -> float | None:
+        if season_complete(self.year):
+            return None
+        scoring_period = (params or {}).get('scoringPeriodId')
+        if scoring_period is not None and self.current_scoring_period is not None and int(scoring_period) < self.current_scoring_period:
+            return None
+        return ESPN_CACHE_TTL_SECONDS
+
+    def _cache_key(self, endpoint: str, params: dict = None, headers: dict = None, private: bool = True) -> str:
+        parts = [endpoint, params, headers]
+        if private:
+            parts.append(hashlib.sha256(json.dumps(self.cookies, sort_keys=True).encode()).hexdigest())
+        return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
+
+    def _cached(self, key: str):
+        return self.cache.get(key) if self.cache else None
+
+    def _store(self, key: str, response, params: dict = None):
+        if self.cache:
+            self.cache.set(key, response, self._ttl(params))
+
+    def _request(self, endpoint: str, params: dict = None, headers: dict = None) -> requests.Response:
+        return self.transport.get(endpoint, params=params, headers=headers, cookies=self.cookies)
+
+    def checkRequestStatus(self, status: int, extend: str = "", params: dict = None, headers: dict = None) -> dict:
+        '''Same endpoint switching as espn_api, with the retry going through _request'''
+        if status == 401:
+            if "/leagueHistory/" in self.LEAGUE_ENDPOINT:
+                base_endpoint = self.LEAGUE_ENDPOINT.split("/leagueHistory/")[0]
+                self.LEAGUE_ENDPOINT = f"{base_endpoint}/seasons/{self.year}/segments/0/leagues/{self.league_id}"
+            else:
+                base_endpoint = self.LEAGUE_ENDPOINT.split("/seasons/")[0]
+                self.LEAGUE_ENDPOINT = f"{base_endpoint}/leagueHistory/{self.league_id}?seasonId={self.year}"
+
+            r = self._request(self.LEAGUE_ENDPOINT + extend, params=params, headers=headers)
+            if r.status_code == 200:
+                return r.json()
+            raise ESPNAccessDenied(f"League {self.league_id} cannot be accessed with the provided cookies")
+
+        return super().checkRequestStatus(status, extend=extend, params=params, headers=headers)
+
+    def get_league(self):
+        data = super().get_league()
+        slot_counts = data.get('settings', {}).get('rosterSettings', {}).get('lineupSlotCounts', {})
+        self.lineup_slot_counts = {
+            POSITION_MAP[int(slot)]: count for slot, count in slot_counts.items()
+            if count and POSITION_MAP.get(int(slot)) not in (None, '', 'BE', 'IR')
+        }
+        return data
+
+    def league_get(self, params: dict = None, headers: dict = None, extend: str = ''):
+        endpoint = self.LEAGUE_ENDPOINT + extend
+        key = self._cache_key(endpoint, params, headers)
+        with espn_call(endpoint_label('league', extend, params)) as call:
+            cached = self._cached(key)
+            if cached is not None:
+                call["cache"] = "hit"
+                return cached
+
+            r = self._request(endpoint, params=params, headers=headers)
+            alternate_response = self.checkRequestStatus(r.status_code, extend=extend, params=params, headers=headers)
+            response = alternate_response if alternate_response else r.json()
+
+        if self.logger:
+            self.logger.log_request(endpoint=self.LEAGUE_ENDPOINT + extend, params=params, headers=headers, response=response)
+
+        response = response[0] if isinstance(response, list) else response
+        self._store(key, response, params)
+        return response
+
+    def get(self, params: dict = None, headers: dict = None, extend: str = ''):
+        endpoint = self.ENDPOINT + extend
+        # pro players and pro schedules are the same for everyone, anything under a league is not
+        key = self._cache_key(endpoint, params, headers, private='/leagues/' in extend)
+        with espn_call(endpoint_label('season', extend, params)) as call:
+            cached = self._cached(key)
+            if cached is not None:
+                call["cache"] = "hit"
+                return cached
+
+            r = self._request(endpoint, params=params, headers=headers)
+            self.checkRequestStatus(r.status_code)
+            response = r.json()
+
+        if self.logger:
+            self.logger.log_request(endpoint=endpoint, params=params, headers=headers, response=response)
+
+        self._store(key, response, params)
+        return response
+
+
+def build_league(league_id: int, year: int, espn_s2: str = None, swid: str = None) -> LeagueRecord:
+    """Load a league whose ESPN traffic goes through the shared response cache.
+
+    The espn_api League is reduced to a LeagueRecord once it has loaded, so
+    only what the stats read is kept. Callers loading the same league and
+    season with the same cookies at the same time share one load and get the
+    same LeagueRecord back.
+    """
+    credentials = hashlib.sha256(json.dumps([espn_s2, swid]).encode()).hexdigest()
+    return league_builds.do((league_id, year, credentials), _load_league, league_id, year, espn_s2, swid)
+
+
+def _load_league(league_id: int, year: int, espn_s2: str = None, swid: str = None) -> LeagueRecord:
+    league = League(league_id=league_id, year=year, espn_s2=espn_s2, swid=swid, fetch_league=False)
+    default_request = league.espn_request
+    league.espn_request = CachedEspnRequests(
+        sport='nba',
+        year=year,
+        league_id=league_id,
+        cookies=default_request.cookies,
+        logger=default_request.logger,
+        cache=response_cache
+    )
+    league.fetch_league()
+    league.espn_request.current_scoring_period = league.scoringPeriodId
+    league.lineup_slot_counts = league.espn_request.lineup_slot_counts
+    return LeagueRecord(league)
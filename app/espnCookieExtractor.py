@@ -1,26 +1,135 @@
 import requests
+from requests.adapters import HTTPAdapter
 from urllib.parse import urlencode
+import hashlib
+import hmac
+import os
 import re
 import json
+import threading
+
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+from app.singleflight import SingleFlight
+from app.store import Store, shared_store
+
+# how long cookies from a username/password login are reused before logging in again, 0 turns the cache off
+COOKIE_CACHE_TTL_SECONDS = int(os.environ.get("COOKIE_CACHE_TTL_SECONDS", "86400"))
+# PBKDF2 rounds turning a username and password into the cache key and the key encrypting the cookies,
+# slow enough that the stored entries are no shortcut to the password
+COOKIE_CACHE_HASH_ROUNDS = 100_000
+
+# keep-alive connections to the Disney login and ESPN hosts, shared by every extractor. Only the
+# connection pool is shared, each login still gets its own session and with it its own cookie jar
+_adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16)
+# several /initialize calls with the same login at once wait on one login, keyed by the login's lookup key
+logins = SingleFlight()
+
+
+class CookieCache:
+    """espn_s2 and SWID cookies by login, so a returning manager skips the Disney login.
+
+    Both keys of an entry come from one PBKDF2 hash of the username and
+    password, neither of which is ever stored: the lookup key it is stored
+    under, and a separate AES-GCM key the cookies are encrypted with. Only
+    someone presenting the password can read the cookies back. Failed logins
+    are not cached, and forget() drops cookies ESPN stopped accepting.
+    """
+
+    def __init__(self, store: Store = shared_store, ttl_seconds: int = COOKIE_CACHE_TTL_SECONDS):
+        self.store = store
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def keys(username: str, password: str) -> tuple[str, bytes]:
+        """(lookup key, encryption key) of a login"""
+        # usernames are email addresses, which ESPN does not treat as case sensitive
+        login = json.dumps([username.strip().lower(), password]).encode()
+        master = hashlib.pbkdf2_hmac('sha256', login, b'fantasy-wrapped-cookies', COOKIE_CACHE_HASH_ROUNDS)
+        # the lookup key is stored in the clear, so the encryption key must not be derivable from it
+        lookup = hmac.new(master, b'lookup', hashlib.sha256).hexdigest()
+        secret = hmac.new(master, b'encrypt', hashlib.sha256).digest()
+        return f"cookies:{lookup}", secret
+
+    def get(self, key: str, secret: bytes):
+        body = self.store.get(key) if self.ttl_seconds else None
+        cookies = None
+        if body is not None:
+            try:
+                cookies = json.loads(AESGCM(secret).decrypt(body[:12], body[12:], key.encode()))
+            except InvalidTag:
+                pass
+        with self._lock:
+            if cookies is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return cookies
+
+    def set(self, key: str, secret: bytes, cookies: dict):
+        if self.ttl_seconds:
+            nonce = os.urandom(12)
+            body = nonce + AESGCM(secret).encrypt(nonce, json.dumps(cookies).encode(), key.encode())
+            self.store.set(key, body, self.ttl_seconds)
+
+    def forget(self, key: str):
+        self.store.delete(key)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "ttl_seconds": self.ttl_seconds, "logins": logins.stats()}
+
+
+cookie_cache = CookieCache()
+
 
 class ESPNCookieExtractor:
-    def __init__(self):
-        self.session = requests.Session()
-        self.session.headers.update({
+    def __init__(self, cache: CookieCache = cookie_cache):
+        self.cache = cache
+        self.session = self._new_session()
+
+    @staticmethod
+    def _new_session():
+        session = requests.Session()
+        session.mount('https://', _adapter)
+        session.mount('http://', _adapter)
+        session.headers.update({
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
         })
-    
+        return session
+
     def get_cookies(self, username, password):
         """
-        Retrieve SWID and espn_s2 cookies from ESPN
-        
+        Retrieve SWID and espn_s2 cookies, from the cookie cache when this login was used recently
+
         Args:
             username (str): ESPN username/email
             password (str): ESPN password
-            
+
         Returns:
             dict: Dictionary containing 'swid' and 'espn_s2' cookies, or None if failed
         """
+        key, secret = self.cache.keys(username, password)
+        cookies = self.cache.get(key, secret)
+        if cookies is not None:
+            return cookies
+        cookies = logins.do(key, self._login, username, password)
+        if cookies:
+            self.cache.set(key, secret, cookies)
+        return cookies
+
+    def forget_cookies(self, username, password):
+        """Drop the cached cookies of this login, e.g. once ESPN rejects them"""
+        self.cache.forget(self.cache.keys(username, password)[0])
+
+    def _login(self, username, password):
+        """Full Disney login and fantasy page load, several seconds"""
+        # a fresh cookie jar per login, the pooled connections underneath are reused
+        self.session = self._new_session()
         try:
             # Step 1: Get the login page to extract any necessary tokens
             login_page_url = "https://registerdisney.go.com/jgc/v8/client/ESPN-ONESITE.WEB-PROD/guest/login"
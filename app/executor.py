@@ -0,0 +1,31 @@
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from app import profiling
+
+# Services and espn_api are synchronous, so anything that can touch ESPN runs here
+# instead of on the event loop. The pool is bounded so a burst of heavy stats
+# queues up rather than starving everything else of threads.
+SERVICES_WORKERS = int(os.environ.get("SERVICES_WORKERS", "4"))
+
+_executor = ThreadPoolExecutor(max_workers=SERVICES_WORKERS, thread_name_prefix="services")
+
+
+async def run_blocking(func, *args, **kwargs):
+    """Run a blocking call on the services executor and await its result"""
+    loop = asyncio.get_running_loop()
+    # run_in_executor does not carry context variables over, the request's timing needs them
+    context = contextvars.copy_context()
+    if profiling.PROFILING_ENABLED:
+        args = (func, *args)
+        func = profiling.track
+    return await loop.run_in_executor(_executor, functools.partial(context.run, func, *args, **kwargs))
+
+
+def shutdown():
+    _executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,180 @@
+from __future__ import annotations
+
+import json
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from app.store import Store, shared_store
+from app.transport import RetryBudget, current_retry_budget
+
+# threads working through queued jobs, separate from the services executor so jobs never hold up requests
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", "2"))
+# jobs waiting for a worker before new submissions are turned away
+JOB_QUEUE_MAX = int(os.environ.get("JOB_QUEUE_MAX", "50"))
+# how long a finished job and its result stay around for polling
+JOB_TTL_SECONDS = int(os.environ.get("JOB_TTL_SECONDS", "1800"))
+# least time between progress updates written to the shared store while a job runs
+JOB_PUBLISH_SECONDS = 0.5
+
+
+class QueueFull(Exception):
+    pass
+
+
+class Job:
+    """One queued computation and how far along it is.
+
+    done and total count the box score periods fetched so far out of the ones
+    the computation needs, so a poller can show a progress bar.
+    """
+
+    def __init__(self, key):
+        self.id = secrets.token_urlsafe(16)
+        self.key = key
+        self.status = "queued"
+        self.done = 0
+        self.total = None
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+
+    def progress(self, done: int, total: int):
+        self.done = done
+        self.total = total
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("done", "failed")
+
+    def to_dict(self) -> dict:
+        job = {
+            "id": self.id,
+            "status": self.status,
+            "progress": {"done": self.done, "total": self.total},
+            "created_at": self.created_at,
+            "finished_at": self.finished_at
+        }
+        if self.status == "done":
+            job["result"] = self.result
+        if self.status == "failed":
+            job["error"] = self.error
+        return job
+
+
+class JobQueue:
+    """In-process worker pool for computations too slow for one request.
+
+    submit(key, func) runs func(progress) on a worker and returns its Job right
+    away. A job with the same key that is still queued, running or finished
+    within ttl_seconds is returned instead of starting another, and once
+    max_queued jobs are waiting submit raises QueueFull.
+
+    With a shared Store every change to a job is also written there, so
+    snapshot(job_id) answers for jobs running in other worker processes.
+    """
+
+    def __init__(self, workers: int = JOB_WORKERS, max_queued: int = JOB_QUEUE_MAX,
+                 ttl_seconds: int = JOB_TTL_SECONDS, shared: Store = None):
+        self.max_queued = max_queued
+        self.ttl_seconds = ttl_seconds
+        self.shared = shared
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="jobs")
+        # job id -> Job, oldest first
+        self._jobs = OrderedDict()
+        self._by_key = {}
+        self._lock = threading.Lock()
+        self.deduplicated = 0
+        self.rejected = 0
+
+    def submit(self, key, func) -> Job:
+        with self._lock:
+            self._expire()
+            job = self._by_key.get(key)
+            if job is not None and job.status != "failed":
+                self.deduplicated += 1
+                return job
+            if sum(1 for job in self._jobs.values() if job.status == "queued") >= self.max_queued:
+                self.rejected += 1
+                raise QueueFull(f"{self.max_queued} jobs already waiting, try again later")
+            job = Job(key)
+            self._jobs[job.id] = job
+            self._by_key[key] = job
+        self._publish(job)
+        self._executor.submit(self._run, job, func)
+        return job
+
+    def _publish(self, job: Job):
+        if self.shared is None:
+            return
+        try:
+            self.shared.set(f"job:{job.id}", json.dumps(job.to_dict()).encode(), self.ttl_seconds)
+        except Exception as e:
+            # pollers on this worker still see the job, the others catch up with the next write
+            print(f"Could not share job {job.id}: {e}")
+
+    def _run(self, job: Job, func):
+        job.status = "running"
+        self._publish(job)
+        published = [time.monotonic()]
+
+        def progress(done: int, total: int):
+            job.progress(done, total)
+            if done == total or time.monotonic() - published[0] >= JOB_PUBLISH_SECONDS:
+                published[0] = time.monotonic()
+                self._publish(job)
+
+        # executor threads do not inherit the submitting request's context, a job gets a retry budget of its own
+        budget_token = current_retry_budget.set(RetryBudget())
+        try:
+            job.result = func(progress)
+            status = "done"
+        except Exception as e:
+            job.error = str(e)
+            status = "failed"
+        finally:
+            current_retry_budget.reset(budget_token)
+        # finished_at first, _expire reads it as soon as the status says finished
+        job.finished_at = time.time()
+        job.status = status
+        self._publish(job)
+
+    def get(self, job_id: str) -> Job | None:
+        with self._lock:
+            self._expire()
+            return self._jobs.get(job_id)
+
+    def snapshot(self, job_id: str) -> dict | None:
+        """to_dict() of the job, looked up in the shared store when it runs in another worker"""
+        job = self.get(job_id)
+        if job is not None:
+            return job.to_dict()
+        body = self.shared.get(f"job:{job_id}") if self.shared is not None else None
+        return json.loads(body) if body is not None else None
+
+    def _expire(self):
+        cutoff = time.time() - self.ttl_seconds
+        for job_id, job in list(self._jobs.items()):
+            if job.finished and job.finished_at < cutoff:
+                del self._jobs[job_id]
+                if self._by_key.get(job.key) is job:
+                    del self._by_key[job.key]
+
+    def stats(self) -> dict:
+        with self._lock:
+            statuses = [job.status for job in self._jobs.values()]
+            return {
+                **{status: statuses.count(status) for status in ("queued", "running", "done", "failed")},
+                "deduplicated": self.deduplicated,
+                "rejected": self.rejected
+            }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+jobs = JobQueue(shared=shared_store)
@@ -0,0 +1,131 @@
+from __future__ import annotations
+
+from collections import Counter
+
+import numpy as np
+
+from app.matrix import ScoreMatrix
+
+# lineup slots that do not score
+INACTIVE_SLOTS = ('BE', 'IR')
+
+
+def optimal_points(players: list[tuple[float, list[int]]], slot_count: int) -> float:
+    """Most points any legal lineup could have scored.
+
+    players is (points, indexes of the slots the player may fill). Points belong
+    to the player, not the slot, so the slots form a transversal matroid and
+    taking players best first, keeping each one that can still be matched
+    (moving earlier picks around through an augmenting path), is optimal.
+    """
+    slot_owner = [-1] * slot_count
+
+    def assign(player: int, seen: list[bool]) -> bool:
+        for slot in players[player][1]:
+            if not seen[slot]:
+                seen[slot] = True
+                if slot_owner[slot] == -1 or assign(slot_owner[slot], seen):
+                    slot_owner[slot] = player
+                    return True
+        return False
+
+    total = 0.0
+    filled = 0
+    for player in sorted(range(len(players)), key=lambda p: players[p][0], reverse=True):
+        if filled == slot_count or players[player][0] <= 0:
+            break
+        if assign(player, [False] * slot_count):
+            total += players[player][0]
+            filled += 1
+    return total
+
+
+def infer_slot_counts(box_scores: dict) -> dict[str, int]:
+    """Starting slot counts taken from the fullest lineup seen, for leagues loaded without roster settings"""
+    counts = Counter()
+    for games in box_scores.values():
+        for box_score in games:
+            for lineup in (box_score.home_lineup, box_score.away_lineup):
+                day = Counter(player.slot_position for player in lineup if player.slot_position not in INACTIVE_SLOTS)
+                for slot, count in day.items():
+                    counts[slot] = max(counts[slot], count)
+    return dict(counts)
+
+
+class LineupIndex:
+    """Actual and best possible lineup points of every team for every day of the season.
+
+    Arrays are team x matchup period x day and line up with DailyScoreIndex.
+    Each day's totals are looked up in day_totals before being worked out and
+    added to it, so an index rebuilt later in the season only solves the days
+    played since.
+    """
+
+    def __init__(self, score_matrix: ScoreMatrix, days_by_week: list[list[tuple[int, int]]], box_scores: dict,
+                 slot_counts: dict[str, int] = None, day_totals: dict = None):
+        self.score_matrix = score_matrix
+        self.days_by_week = days_by_week
+        slot_counts = slot_counts or infer_slot_counts(box_scores)
+        # one index per physical slot, e.g. three UT slots become three entries
+        self.slots = [slot for slot, count in sorted(slot_counts.items()) for _ in range(count)]
+        slot_indexes = {}
+        for index, slot in enumerate(self.slots):
+            slot_indexes.setdefault(slot, []).append(index)
+
+        shape = (len(score_matrix.teams), len(days_by_week), max((len(days) for days in days_by_week), default=0))
+        self.actual = np.zeros(shape)
+        self.optimal = np.zeros(shape)
+        self.has_day = np.zeros(shape, dtype=bool)
+
+        eligible_cache = {}
+        day_totals = {} if day_totals is None else day_totals
+        rows = score_matrix.rows
+        for week, days in enumerate(days_by_week):
+            for day, period in enumerate(days):
+                if period not in box_scores:
+                    continue
+                totals = day_totals.get(period)
+                if totals is None:
+                    totals = {}
+                    for box_score in box_scores[period]:
+                        for team, lineup in ((box_score.home_team, box_score.home_lineup), (box_score.away_team, box_score.away_lineup)):
+                            team_id = getattr(team, 'team_id', None)
+                            if team_id is None:
+                                continue
+                            players = []
+                            for player in lineup:
+                                eligible = tuple(getattr(player, 'eligibleSlots', ()))
+                                if eligible not in eligible_cache:
+                                    eligible_cache[eligible] = [index for slot in eligible for index in slot_indexes.get(slot, [])]
+                                players.append((player.points, eligible_cache[eligible]))
+                            actual = sum(player.points for player in lineup if player.slot_position not in INACTIVE_SLOTS)
+                            totals[team_id] = (actual, optimal_points(players, len(self.slots)))
+                    day_totals[period] = totals
+                for team_id, (actual, optimal) in totals.items():
+                    row = rows.get(team_id)
+                    if row is not None:
+                        self.actual[row, week, day] = actual
+                        self.optimal[row, week, day] = optimal
+                        self.has_day[row, week, day] = True
+
+    def missing(self, team) -> float:
+        row = self.score_matrix.row(team)
+        return float(np.maximum(self.optimal[row] - self.actual[row], 0)[self.has_day[row]].sum())
+
+    def report(self, team) -> list[dict]:
+        """Actual versus optimal points for each matchup period and each of its days"""
+        row = self.score_matrix.row(team)
+        weeks = []
+        for week, days in enumerate(self.days_by_week):
+            daily = [
+                {"scoring_period": period[1], "actual": round(float(self.actual[row, week, day]), 2),
+                 "optimal": round(float(self.optimal[row, week, day]), 2)}
+                for day, period in enumerate(days) if self.has_day[row, week, day]
+            ]
+            weeks.append({
+                "week": week + 1,
+                "actual": round(sum(day["actual"] for day in daily), 2),
+                "optimal": round(sum(day["optimal"] for day in daily), 2),
+                "days": daily
+            })
+        return weeks
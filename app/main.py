@@ -1,10 +1,18 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse
 from app.routes import router
+from app import executor
+from app.jobs import jobs
+from app.store import shared_store
+from app.metrics import RequestTiming, current_timing, http_request_seconds
+from app.transport import RetryBudget, current_retry_budget
+from app import profiling
 from pathlib import Path
 import os
+import threading
+import time
 
 app = FastAPI(
     title="Fantasy Basketball Wrapped API",
@@ -21,9 +29,82 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+
+# Time every request and report where it went in a Server-Timing header, and give its ESPN calls one retry budget
+@app.middleware("http")
+async def record_timing(request: Request, call_next):
+    timing = RequestTiming()
+    token = current_timing.set(timing)
+    budget_token = current_retry_budget.set(RetryBudget())
+    started = time.perf_counter()
+    try:
+        response = await call_next(request)
+    finally:
+        current_timing.reset(token)
+        current_retry_budget.reset(budget_token)
+    route = request.scope.get("route")
+    http_request_seconds.observe(
+        time.perf_counter() - started,
+        method=request.method,
+        route=route.path if route else "unmatched",
+        status=str(response.status_code)
+    )
+    response.headers["Server-Timing"] = timing.header()
+    return response
+
+
+# ?profile=1 or an X-Profile: 1 header samples the request, see GET /profiles. Only wired in when
+# PROFILING_ENABLED=1 so regular deployments do not even pay for the check
+if profiling.PROFILING_ENABLED:
+    @app.middleware("http")
+    async def profile_request(request: Request, call_next):
+        if request.query_params.get("profile") != "1" and request.headers.get("x-profile") != "1":
+            return await call_next(request)
+
+        profile = profiling.Profile(f"{request.method} {request.url.path}")
+        loop_thread = threading.get_ident()
+        profile.attach(loop_thread)
+        token = profiling.current_profile.set(profile)
+        try:
+            response = await call_next(request)
+        except Exception:
+            profile.detach(loop_thread)
+            profile.stop()
+            raise
+        finally:
+            profiling.current_profile.reset(token)
+
+        # the body may still be streaming, the profile ends with its last chunk
+        body = response.body_iterator
+
+        async def profiled_body():
+            try:
+                async for chunk in body:
+                    yield chunk
+            finally:
+                profile.detach(loop_thread)
+                profile.stop()
+                profiling.keep(profile)
+
+        response.body_iterator = profiled_body()
+        response.headers["X-Profile-Id"] = profile.id
+        return response
+
 # Include API routes
 app.include_router(router)
 
+
+@app.on_event("startup")
+def purge_shared_store():
+    # ended sessions, old job snapshots and stale reports are never read again but stay in the file until purged
+    shared_store.purge_expired()
+
+
+@app.on_event("shutdown")
+def shutdown_executor():
+    executor.shutdown()
+    jobs.shutdown()
+
 # Serve React static build files (must run `npm run build` first)
 app.mount("/static", StaticFiles(directory="fantasy-basketball-frontend/build/static"), name="static")
 
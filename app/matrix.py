@@ -0,0 +1,182 @@
+from __future__ import annotations
+
+import numpy as np
+from app.records import LeagueRecord, TeamRecord
+
+
+def longest_runs(mask: np.ndarray) -> np.ndarray:
+    """Length of the longest run of True in each row of a 2d boolean array"""
+    if mask.shape[1] == 0:
+        return np.zeros(mask.shape[0], dtype=int)
+    columns = np.arange(1, mask.shape[1] + 1)
+    # column of the most recent False at or before each position, so the run ending there is the distance to it
+    last_break = np.maximum.accumulate(np.where(mask, 0, columns), axis=1)
+    return (columns - last_break).max(axis=1)
+
+
+class ScoreMatrix:
+    """The league schedule as team x matchup period arrays, built once when the league loads.
+
+    Rows follow league.teams, columns are matchup periods in schedule order.
+    points_for and points_against are seen from the row team's side, won uses
+    ESPN's winner flag and opponent holds the row index of the other team.
+    played is False for matchups ESPN has not decided yet, the current one
+    and every week after it in season, and every stat leaves them out.
+    Schedules run into the playoffs, the stats only look at the first weeks
+    columns, the league's regular season.
+    """
+
+    def __init__(self, league: LeagueRecord):
+        self.teams = list(league.teams)
+        self.rows = {team.team_id: row for row, team in enumerate(self.teams)}
+        periods = max((len(team.schedule) for team in self.teams), default=0)
+        shape = (len(self.teams), periods)
+        self.weeks = getattr(league, 'reg_season_count', None) or periods
+
+        self.points_for = np.zeros(shape)
+        self.points_against = np.zeros(shape)
+        self.won = np.zeros(shape, dtype=bool)
+        self.opponent = np.full(shape, -1, dtype=int)
+        self.played = np.zeros(shape, dtype=bool)
+
+        for row, team in enumerate(self.teams):
+            for week, matchup in enumerate(team.schedule):
+                is_home = matchup.home_team == team
+                opponent = matchup.away_team if is_home else matchup.home_team
+                self.points_for[row, week] = matchup.home_final_score if is_home else matchup.away_final_score
+                self.points_against[row, week] = matchup.away_final_score if is_home else matchup.home_final_score
+                self.won[row, week] = matchup.winner == ('HOME' if is_home else 'AWAY')
+                self.opponent[row, week] = self.rows.get(getattr(opponent, 'team_id', None), -1)
+                self.played[row, week] = matchup.winner != 'UNDECIDED'
+
+        # every streak in the league in one pass, anything that is not a win breaks a win streak
+        self.win_streaks = longest_runs(self.won & self.played)
+        self.loss_streaks = longest_runs(~self.won & self.played)
+
+    def row(self, team: TeamRecord) -> int:
+        return self.rows[team.team_id]
+
+    def best_week(self, team: TeamRecord) -> tuple[int, float]:
+        row = self.row(team)
+        scores = np.where(self.played[row, :self.weeks], self.points_for[row, :self.weeks], -np.inf)
+        if scores.size == 0 or scores.max() <= 0:
+            return 0, 0
+        week = int(scores.argmax())
+        return week + 1, float(scores[week])
+
+    def worst_week(self, team: TeamRecord) -> tuple[int, float]:
+        row = self.row(team)
+        scores = np.where(self.played[row, :self.weeks], self.points_for[row, :self.weeks], np.inf)
+        if scores.size == 0 or not self.played[row, :self.weeks].any():
+            return 0, float('inf')
+        week = int(scores.argmin())
+        return week + 1, float(scores[week])
+
+    def longest_streak(self, team: TeamRecord) -> tuple[int, int]:
+        row = self.row(team)
+        return int(self.win_streaks[row]), int(self.loss_streaks[row])
+
+    def played_weeks(self, team: TeamRecord) -> int:
+        """Regular season matchups the team has finished"""
+        return int(self.played[self.row(team), :self.weeks].sum())
+
+    def close_wins(self, team: TeamRecord, point_diff_threshold: float) -> list[int]:
+        row, weeks = self.row(team), self.weeks
+        margin = np.abs(self.points_for[row, :weeks] - self.points_against[row, :weeks])
+        return np.flatnonzero(self.won[row, :weeks] & self.played[row, :weeks] & (margin <= point_diff_threshold)).tolist()
+
+    def wins(self, team: TeamRecord) -> list[int]:
+        row = self.row(team)
+        return np.flatnonzero(self.won[row] & self.played[row]).tolist()
+
+    def _most_common_opponent(self, row: int, mask: np.ndarray, weeks: int) -> tuple[TeamRecord, int] | None:
+        # a matchup still being played has partial scores, it is nobody's win or loss yet
+        mask = mask & self.played[row, :weeks] & (self.opponent[row, :weeks] >= 0)
+        opponents = self.opponent[row, :weeks][mask]
+        if opponents.size == 0:
+            return None
+        counts = np.bincount(opponents, minlength=len(self.teams))
+        tied = np.flatnonzero(counts == counts.max())
+        # on a tie the opponent met first in the schedule wins, same as counting in order
+        first_met = min(tied, key=lambda opponent: int(np.argmax(opponents == opponent)))
+        return self.teams[first_met], int(counts[first_met])
+
+    def best_matchup(self, team: TeamRecord) -> tuple[TeamRecord, int] | None:
+        row, weeks = self.row(team), self.weeks
+        return self._most_common_opponent(row, self.points_for[row, :weeks] > self.points_against[row, :weeks], weeks)
+
+    def worst_matchup(self, team: TeamRecord) -> tuple[TeamRecord, int] | None:
+        row, weeks = self.row(team), self.weeks
+        return self._most_common_opponent(row, self.points_for[row, :weeks] < self.points_against[row, :weeks], weeks)
+
+
+class DailyScoreIndex:
+    """Running daily scores of every matchup, built from the box scores the service already pulls.
+
+    Arrays are team x matchup period x day, rows and matchup periods line up
+    with the ScoreMatrix. lead is the row team's cumulative points minus its
+    opponent's after each day; days a matchup does not have, or that have no
+    box score yet, are left out through has_day.
+    """
+
+    def __init__(self, score_matrix: ScoreMatrix, days_by_week: list[list[tuple[int, int]]], box_scores: dict):
+        self.score_matrix = score_matrix
+        shape = (len(score_matrix.teams), len(days_by_week), max((len(days) for days in days_by_week), default=0))
+        points_for = np.zeros(shape)
+        points_against = np.zeros(shape)
+        self.has_day = np.zeros(shape, dtype=bool)
+
+        rows = score_matrix.rows
+        for week, days in enumerate(days_by_week):
+            for day, period in enumerate(days):
+                for box_score in box_scores.get(period, ()):
+                    home = rows.get(getattr(box_score.home_team, 'team_id', None))
+                    away = rows.get(getattr(box_score.away_team, 'team_id', None))
+                    if home is not None:
+                        points_for[home, week, day] = box_score.home_score
+                        points_against[home, week, day] = box_score.away_score
+                        self.has_day[home, week, day] = True
+                    if away is not None:
+                        points_for[away, week, day] = box_score.away_score
+                        points_against[away, week, day] = box_score.home_score
+                        self.has_day[away, week, day] = True
+
+        self.lead = np.cumsum(points_for, axis=2) - np.cumsum(points_against, axis=2)
+
+    def _largest(self, row: int, weeks: np.ndarray, values: np.ndarray) -> tuple[float, int, int]:
+        """Largest value over the days of the selected weeks as (value, week index, day), first one on ties"""
+        values = np.where(weeks[:, None] & self.has_day[row], values, -np.inf)
+        if values.size == 0:
+            return -np.inf, -1, -1
+        week, day = np.unravel_index(int(values.argmax()), values.shape)
+        return float(values[week, day]), int(week), int(day)
+
+    def biggest_comeback(self, team: TeamRecord) -> tuple[float, int, TeamRecord | None]:
+        """Largest deficit the team was facing in a matchup it went on to win"""
+        row = self.score_matrix.row(team)
+        weeks = (self.score_matrix.played & self.score_matrix.won)[row, :self.lead.shape[1]]
+        deficit, week, _ = self._largest(row, weeks, -self.lead[row])
+        if deficit <= -1:
+            return -1, -1, None
+        return deficit, week + 1, self.score_matrix.teams[self.score_matrix.opponent[row, week]]
+
+    def biggest_blown_lead(self, team: TeamRecord) -> tuple[float, int, TeamRecord | None]:
+        """Largest lead the team held in a matchup it went on to lose"""
+        row = self.score_matrix.row(team)
+        weeks = (self.score_matrix.played & ~self.score_matrix.won)[row, :self.lead.shape[1]]
+        lead, week, _ = self._largest(row, weeks, self.lead[row])
+        if lead <= 0:
+            return 0, -1, None
+        return lead, week + 1, self.score_matrix.teams[self.score_matrix.opponent[row, week]]
+
+    def lead_changes(self, team: TeamRecord) -> int:
+        """Times the lead flipped from one side to the other across every matchup of the season"""
+        row = self.score_matrix.row(team)
+        signs = np.where(self.has_day[row], np.sign(self.lead[row]), 0)
+        if signs.size == 0:
+            return 0
+        # carry the last non-zero sign over tied days so a tie in between is not a change
+        days = np.arange(signs.shape[1])
+        last_signed = np.maximum.accumulate(np.where(signs != 0, days, 0), axis=1)
+        signs = np.take_along_axis(signs, last_signed, axis=1)
+        return int((signs[:, 1:] * signs[:, :-1] < 0).sum())
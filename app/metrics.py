@@ -0,0 +1,143 @@
+from __future__ import annotations
+
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+# seconds, the top buckets are there for full season sweeps
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labelnames: tuple[str, ...], values: tuple, le: str = None) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)]
+    if le is not None:
+        pairs.append(f'le="{le}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = (), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        # labels -> [count per bucket, sum, count]
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        with self._lock:
+            entry = self._values.setdefault(key, [[0] * len(self.buckets), 0.0, 0])
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (bucket_counts, total, count) in sorted(self._values.items()):
+                for bound, bucket_count in zip(self.buckets, bucket_counts):
+                    lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, bound)} {bucket_count}")
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, '+Inf')} {count}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {total}")
+                lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+espn_requests = Counter(
+    "espn_requests_total", "ESPN API requests by endpoint and whether the response cache answered them",
+    ("endpoint", "cache")
+)
+espn_request_seconds = Histogram(
+    "espn_request_seconds", "Time spent on ESPN API requests, cache hits included", ("endpoint", "cache")
+)
+espn_retries = Counter(
+    "espn_retries_total", "ESPN requests retried by what went wrong, budget_exhausted when a retry was refused", ("reason",)
+)
+box_score_lookups = Counter(
+    "box_score_lookups_total", "In-memory box score cache lookups by result", ("result",)
+)
+http_request_seconds = Histogram(
+    "http_request_seconds", "Time to produce a response by route", ("method", "route", "status")
+)
+
+REGISTRY = (espn_requests, espn_request_seconds, espn_retries, box_score_lookups, http_request_seconds)
+
+
+def render() -> str:
+    """Every metric in the Prometheus text exposition format"""
+    return "\n".join(line for metric in REGISTRY for line in metric.render()) + "\n"
+
+
+class RequestTiming:
+    """ESPN time spent on behalf of one HTTP request, reported back in its Server-Timing header"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.espn_seconds = 0.0
+        self.espn_calls = 0
+        self.cache_hits = 0
+        self._lock = threading.Lock()
+
+    def add(self, cache: str, seconds: float):
+        with self._lock:
+            if cache == "hit":
+                self.cache_hits += 1
+            else:
+                self.espn_calls += 1
+                self.espn_seconds += seconds
+
+    def header(self) -> str:
+        total = (time.perf_counter() - self.started) * 1000
+        with self._lock:
+            return (f'espn;dur={self.espn_seconds * 1000:.1f};desc="{self.espn_calls} ESPN calls", '
+                    f'cache;desc="{self.cache_hits} cache hits", total;dur={total:.1f}')
+
+
+# set per HTTP request; copied into executor threads by run_blocking and BoxScoreCache.prefetch
+current_timing = contextvars.ContextVar("current_timing", default=None)
+
+
+@contextmanager
+def espn_call(endpoint: str):
+    """Time one ESPN request, set cache to "hit" on the yielded dict when the response cache answered it"""
+    call = {"cache": "miss"}
+    started = time.perf_counter()
+    try:
+        yield call
+    finally:
+        seconds = time.perf_counter() - started
+        espn_requests.inc(endpoint=endpoint, cache=call["cache"])
+        espn_request_seconds.observe(seconds, endpoint=endpoint, cache=call["cache"])
+        timing = current_timing.get()
+        if timing is not None:
+            timing.add(call["cache"], seconds)
@@ -0,0 +1,41 @@
+from __future__ import annotations
+
+
+class ScoringCalendar:
+    """The exact scoring periods (days) of every matchup period of one league.
+
+    Built once per league load from the schedule, where ESPN lists every day a
+    matchup has points for in pointsByScoringPeriod and espn_api collects them
+    as League.matchup_ids. That covers matchups of any length, all star break
+    matchups, and days nobody played on are simply not there. A matchup period
+    nothing has been played in yet has no days, and the current matchup is
+    extended up to the current scoring period so the live day is included.
+    Every box score fetch is planned from here.
+    """
+
+    def __init__(self, matchup_ids: dict, first_scoring_period: int = 1, final_scoring_period: int = None,
+                 current_matchup_period: int = None, current_scoring_period: int = None):
+        final_scoring_period = final_scoring_period or float('inf')
+        # espn_api keeps the days as strings sorted as strings, so "100" comes before "99"
+        self._days = {
+            int(matchup_period): sorted({int(day) for day in days if first_scoring_period <= int(day) <= final_scoring_period})
+            for matchup_period, days in matchup_ids.items()
+        }
+
+        season_running = current_scoring_period is not None and current_scoring_period <= final_scoring_period
+        if season_running and current_matchup_period is not None:
+            days = self._days.setdefault(current_matchup_period, [])
+            previous_end = max((day for period, period_days in self._days.items() if period < current_matchup_period
+                                for day in period_days), default=first_scoring_period - 1)
+            days.extend(range(max(days + [previous_end]) + 1, current_scoring_period + 1))
+
+    def days(self, matchup_period: int) -> list[int]:
+        return self._days.get(matchup_period, [])
+
+    def last_day(self, matchup_period: int) -> int | None:
+        days = self.days(matchup_period)
+        return days[-1] if days else None
+
+    def pairs(self, matchup_period: int) -> list[tuple[int, int]]:
+        """(matchup_period, scoring_period) of every day of the matchup period, the box score cache's keys"""
+        return [(matchup_period, day) for day in self.days(matchup_period)]
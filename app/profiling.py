@@ -0,0 +1,127 @@
+from __future__ import annotations
+
+import contextvars
+import os
+import re
+import secrets
+import sys
+import threading
+import time
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+
+# debug only: nothing is wired in unless this is set, so production pays nothing for it
+PROFILING_ENABLED = os.environ.get("PROFILING_ENABLED", "") == "1"
+# time between stack samples
+PROFILE_INTERVAL_MS = float(os.environ.get("PROFILE_INTERVAL_MS", "5"))
+# finished profiles kept for GET /profiles/{profile_id}, oldest dropped first
+PROFILE_KEEP = int(os.environ.get("PROFILE_KEEP", "20"))
+
+
+def _frame_label(frame) -> str:
+    return f"{frame.f_globals.get('__name__', '?')}:{frame.f_code.co_name}"
+
+
+class Profile:
+    """Sampling profile of the threads working on one request.
+
+    A background thread walks the stacks of every thread registered with
+    thread() every PROFILE_INTERVAL_MS and counts identical stacks, which
+    collapsed() writes out in the folded format flamegraph.pl and speedscope
+    read. Stacks are rooted at the thread's name, so time on the event loop,
+    the services executor and the box score fetchers stay apart.
+    """
+
+    def __init__(self, route: str, interval_ms: float = PROFILE_INTERVAL_MS):
+        self.id = secrets.token_urlsafe(8)
+        self.route = route
+        self.interval = interval_ms / 1000
+        self.stacks = Counter()
+        self.started = time.perf_counter()
+        self.seconds = None
+        self._threads = Counter()
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._sampler = threading.Thread(target=self._sample, name="profiler", daemon=True)
+        self._sampler.start()
+
+    def attach(self, ident: int):
+        with self._lock:
+            self._threads[ident] += 1
+
+    def detach(self, ident: int):
+        with self._lock:
+            self._threads[ident] -= 1
+            if not self._threads[ident]:
+                del self._threads[ident]
+
+    @contextmanager
+    def thread(self):
+        """Include the calling thread in the samples while the block runs"""
+        ident = threading.get_ident()
+        self.attach(ident)
+        try:
+            yield
+        finally:
+            self.detach(ident)
+
+    def _sample(self):
+        while not self._stopped.wait(self.interval):
+            frames = sys._current_frames()
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            with self._lock:
+                idents = list(self._threads)
+            for ident in idents:
+                frame = frames.get(ident)
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                if stack:
+                    thread = re.sub(r'[_-]\d+$', '', names.get(ident, 'thread'))
+                    self.stacks[";".join([thread] + stack[::-1])] += 1
+
+    def stop(self):
+        if not self._stopped.is_set():
+            self._stopped.set()
+            self._sampler.join()
+            self.seconds = time.perf_counter() - self.started
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+# the profile of the request being handled, copied into executor threads with the rest of the context
+current_profile = contextvars.ContextVar("current_profile", default=None)
+
+_profiles = OrderedDict()
+_profiles_lock = threading.Lock()
+
+
+def track(func, *args, **kwargs):
+    """Call func, sampling this thread if the current request is being profiled"""
+    profile = current_profile.get()
+    if profile is None:
+        return func(*args, **kwargs)
+    with profile.thread():
+        return func(*args, **kwargs)
+
+
+def keep(profile: Profile):
+    with _profiles_lock:
+        _profiles[profile.id] = profile
+        while len(_profiles) > PROFILE_KEEP:
+            _profiles.popitem(last=False)
+
+
+def get(profile_id: str) -> Profile | None:
+    with _profiles_lock:
+        return _profiles.get(profile_id)
+
+
+def summaries() -> list[dict]:
+    with _profiles_lock:
+        return [
+            {"id": profile.id, "route": profile.route, "seconds": profile.seconds, "samples": sum(profile.stacks.values())}
+            for profile in reversed(_profiles.values())
+        ]
@@ -0,0 +1,201 @@
+from __future__ import annotations
+
+import json
+import sys
+
+from espn_api.basketball import League
+
+from app.periods import ScoringCalendar
+
+# a player's eligible slots repeat across every box score they appear in, each distinct list is stored once
+_slot_lists = {}
+
+
+def _intern(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+def _slots(slots) -> tuple[str, ...]:
+    slots = tuple(_intern(slot) for slot in slots)
+    return _slot_lists.setdefault(slots, slots)
+
+
+class PlayerRecord:
+    """The fields of an espn_api Player or BoxPlayer that the stats read.
+
+    espn_api players carry every stat split ESPN sent, their pro schedule and
+    news; a season of box scores holds tens of thousands of them. Records keep
+    the handful of numbers the wrapped stats use under the same attribute
+    names, with names and slot lists shared between records.
+    """
+
+    __slots__ = ('name', 'slot_position', 'points', 'avg_points', 'projected_avg_points',
+                 'total_points', 'projected_total_points', 'acquisitionType', 'eligibleSlots')
+
+    def __init__(self, name: str, slot_position: str, points: float, avg_points: float, projected_avg_points: float,
+                 total_points: float, projected_total_points: float, acquisitionType: str, eligibleSlots: tuple[str, ...]):
+        self.name = name
+        self.slot_position = slot_position
+        self.points = points
+        self.avg_points = avg_points
+        self.projected_avg_points = projected_avg_points
+        self.total_points = total_points
+        self.projected_total_points = projected_total_points
+        self.acquisitionType = acquisitionType
+        self.eligibleSlots = eligibleSlots
+
+    @classmethod
+    def from_player(cls, player) -> PlayerRecord:
+        return cls(
+            _intern(player.name),
+            # roster players only have the slot they sit in today, box score players the slot they played that day
+            _intern(getattr(player, 'slot_position', player.lineupSlot)),
+            getattr(player, 'points', 0),
+            player.avg_points,
+            player.projected_avg_points,
+            player.total_points,
+            player.projected_total_points,
+            _intern(player.acquisitionType),
+            _slots(player.eligibleSlots),
+        )
+
+    def __repr__(self):
+        return f'PlayerRecord({self.name}, points:{self.points})'
+
+
+class MatchupRecord:
+    """One week of a team's schedule, home_team and away_team are TeamRecords (or the raw id for a bye)"""
+
+    __slots__ = ('home_team', 'away_team', 'home_final_score', 'away_final_score', 'winner')
+
+    def __init__(self, home_team, away_team, home_final_score: float, away_final_score: float, winner: str):
+        self.home_team = home_team
+        self.away_team = away_team
+        self.home_final_score = home_final_score
+        self.away_final_score = away_final_score
+        self.winner = winner
+
+
+class TeamRecord:
+    __slots__ = ('team_id', 'team_name', 'owner_ids', 'points_for', 'points_against', 'roster', 'schedule')
+
+    def __init__(self, team_id: int, team_name: str, owner_ids: tuple[str, ...], points_for: float,
+                 points_against: float, roster: tuple[PlayerRecord, ...]):
+        self.team_id = team_id
+        self.team_name = team_name
+        self.owner_ids = owner_ids
+        self.points_for = points_for
+        self.points_against = points_against
+        self.roster = roster
+        # filled in by LeagueRecord once every team of the league exists
+        self.schedule = ()
+
+    @classmethod
+    def from_team(cls, team) -> TeamRecord:
+        return cls(
+            team.team_id,
+            team.team_name,
+            tuple(owner.get('id') for owner in team.owners),
+            team.points_for,
+            team.points_against,
+            tuple(PlayerRecord.from_player(player) for player in team.roster),
+        )
+
+    def __repr__(self):
+        return f'TeamRecord({self.team_name})'
+
+
+class BoxScoreRecord:
+    __slots__ = ('home_team', 'away_team', 'home_score', 'away_score', 'home_lineup', 'away_lineup')
+
+    def __init__(self, home_team, away_team, home_score: float, away_score: float,
+                 home_lineup: tuple[PlayerRecord, ...], away_lineup: tuple[PlayerRecord, ...]):
+        self.home_team = home_team
+        self.away_team = away_team
+        self.home_score = home_score
+        self.away_score = away_score
+        self.home_lineup = home_lineup
+        self.away_lineup = away_lineup
+
+
+class LeagueRecord:
+    """A loaded league reduced to what the stats read, so the espn_api League can be dropped.
+
+    Teams, rosters and schedules are projected once at load time. Box scores
+    are fetched through the league's ESPN requests like League.box_scores does
+    and projected straight away, so no BoxScore or BoxPlayer outlives the call.
+    """
+
+    def __init__(self, league: League):
+        self.league_id = league.league_id
+        self.year = league.year
+        self.name = getattr(league.settings, 'name', 'Unknown League')
+        self.current_week = league.current_week
+        self.currentMatchupPeriod = league.currentMatchupPeriod
+        self.scoringPeriodId = league.scoringPeriodId
+        self.finalScoringPeriod = league.finalScoringPeriod
+        # matchup periods in the regular season, the schedule goes on into the playoffs
+        self.reg_season_count = getattr(league.settings, 'reg_season_count', None)
+        # matchup period -> its scoring periods as strings, as espn_api maps them
+        self.matchup_ids = league.matchup_ids
+        self.calendar = ScoringCalendar(league.matchup_ids, league.firstScoringPeriod, league.finalScoringPeriod,
+                                        league.currentMatchupPeriod, league.scoringPeriodId)
+        # set by build_league from the league's roster settings
+        self.lineup_slot_counts = getattr(league, 'lineup_slot_counts', None)
+        self.espn_request = league.espn_request
+        self._box_score_class = league.BoxScoreClass
+
+        self.teams = [TeamRecord.from_team(team) for team in league.teams]
+        self._teams_by_id = {team.team_id: team for team in self.teams}
+        for record, team in zip(self.teams, league.teams):
+            record.schedule = tuple(
+                MatchupRecord(self._team(matchup.home_team), self._team(matchup.away_team),
+                              matchup.home_final_score, matchup.away_final_score, matchup.winner)
+                for matchup in team.schedule
+            )
+
+    def _team(self, team):
+        team_id = getattr(team, 'team_id', team)
+        return self._teams_by_id.get(team_id, team_id)
+
+    def box_scores(self, matchup_period: int = None, scoring_period: int = None) -> list[BoxScoreRecord]:
+        """Every matchup's box score for one scoring period, the request League.box_scores(matchup_total=False) makes"""
+        # periods are resolved the way espn_api does, including a falsy scoring period meaning the matchup's last one
+        matchup_id = self.currentMatchupPeriod
+        scoring_id = self.current_week
+        if matchup_period and scoring_period:
+            matchup_id = matchup_period
+            scoring_id = scoring_period
+        elif matchup_period and matchup_period < matchup_id:
+            matchup_id = matchup_period
+            scoring_id = self.matchup_ids[matchup_period][-1] if matchup_period in self.matchup_ids else 1
+        elif scoring_period and scoring_period <= scoring_id:
+            scoring_id = scoring_period
+            for matchup in self.matchup_ids.keys():
+                if str(scoring_id) in self.matchup_ids[matchup]:
+                    matchup_id = matchup
+                    break
+
+        params = {
+            'view': ['mMatchupScore', 'mScoreboard'],
+            'scoringPeriodId': scoring_id
+        }
+        filters = {"schedule": {"filterMatchupPeriodIds": {"value": [matchup_id]}}}
+        data = self.espn_request.league_get(params=params, headers={'x-fantasy-filter': json.dumps(filters)})
+
+        records = []
+        for matchup in data['schedule']:
+            # no pro schedule: it only feeds BoxPlayer.pro_opponent and game_played, and walking it costs more than the rest of the player
+            box_score = self._box_score_class(matchup, {}, False, self.year, scoring_id)
+            records.append(BoxScoreRecord(
+                self._team(box_score.home_team),
+                self._team(box_score.away_team),
+                getattr(box_score, 'home_score', 0),
+                getattr(box_score, 'away_score', 0),
+                tuple(PlayerRecord.from_player(player) for player in box_score.home_lineup),
+                tuple(PlayerRecord.from_player(player) for player in box_score.away_lineup),
+            ))
+        return records
+
+    def __repr__(self):
+        return f'LeagueRecord({self.league_id}, {self.year})'
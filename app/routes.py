@@ -1,15 +1,27 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import BaseModel, Field
-from espn_api.basketball import League
-from app.espnCookieExtractor import ESPNCookieExtractor
+from app.espnCookieExtractor import ESPNCookieExtractor, cookie_cache
 from app.services import Services
+from app.espn import build_league, league_builds
+from app.transport import EspnThrottled, espn_transport
+from app.engine import engines
+from app.executor import run_blocking
+from app.jobs import jobs, QueueFull
+from app import metrics, profiling
+from app.sessions import SessionStore
+from app.store import shared_store
 from typing import Optional
+import asyncio
+import json
+import math
 
 
 router = APIRouter()
 
-# Global variable to store current services instance
-current_services = None
+# Services instance of every initialized user, keyed by the session token /initialize hands out. The
+# league and cookies behind each one go in the shared store so any worker process can rebuild it
+sessions = SessionStore(weigh=lambda services: services.approx_size(), shared=shared_store)
 
 
 class ESPNCredentials(BaseModel):
@@ -21,6 +33,45 @@ class ESPNCredentials(BaseModel):
     password: Optional[str] = Field(None, description="ESPN password (alternative to cookies)")
 
 
+def _restore_services(record: dict) -> Services:
+    """Rebuild a session from its shared record, the league load is served from the shared response cache"""
+    league = build_league(record["league_id"], record["year"], record["espn_s2"], record["swid"])
+    engine = engines.get(league)
+    team = next((team for team in engine.league.teams if team.team_id == record["team_id"]), None)
+    return Services(record["league_id"], record["year"], record["espn_s2"], record["swid"], engine=engine, team=team)
+
+
+def _throttled(e: EspnThrottled) -> HTTPException:
+    """503 with a Retry-After when ESPN is throttling us, rather than the generic 500"""
+    return HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(math.ceil(e.retry_after))})
+
+
+async def get_current_services(authorization: Optional[str] = Header(None)) -> Optional[Services]:
+    """Look up the caller's Services from an `Authorization: Bearer <session_token>` header"""
+    if not authorization:
+        return None
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() != "bearer":
+        return None
+    token = token.strip()
+    services = sessions.get(token)
+    if services is not None and services.engine is not None and services.engine.released and sessions.record(token):
+        # the league's engine was dropped or refreshed, the session moves to the current one
+        services = None
+    if services is None:
+        # initialized through another worker, or evicted from this one to make room
+        record = sessions.record(token)
+        if record is not None:
+            try:
+                services = await run_blocking(_restore_services, record)
+            except EspnThrottled as e:
+                raise _throttled(e)
+            except Exception as e:
+                raise HTTPException(status_code=503, detail=f"Could not restore session: {str(e)}")
+            sessions.adopt(token, services)
+    return services
+
+
 @router.get("/")
 def read_root():
     return {"message": "Welcome to Fantasy Wrapped!"}
@@ -30,21 +81,25 @@ def read_root():
 async def initialize_services(credentials: ESPNCredentials):
     """Initialize services with ESPN credentials - supports multiple auth methods"""
     try:
-        global current_services
-        
         # Try different authentication methods
         league = None
+        # cookies the league was loaded with, kept with the session so other workers can load it too
+        league_cookies = {"espn_s2": None, "swid": None}
         
         # Method 1: Try with cookies (most reliable for private leagues)
         if credentials.espn_s2 and credentials.swid:
             try:
-                league = League(
+                league = await run_blocking(
+                    build_league,
                     league_id=credentials.league_id,
                     year=credentials.year,
                     espn_s2=credentials.espn_s2,
                     swid=credentials.swid
                 )
+                league_cookies = {"espn_s2": credentials.espn_s2, "swid": credentials.swid}
                 print("✓ Successfully authenticated with ESPN cookies")
+            except EspnThrottled:
+                raise
             except Exception as e:
                 print(f"Cookie auth failed: {e}")
         
@@ -52,28 +107,37 @@ async def initialize_services(credentials: ESPNCredentials):
         if not league and credentials.username and credentials.password:
             try:
                 extractor = ESPNCookieExtractor()
-                cookies = extractor.get_cookies(credentials.username, credentials.password)
+                cookies = await run_blocking(extractor.get_cookies, credentials.username, credentials.password)
                 if cookies:
-                    league = League(
+                    league = await run_blocking(
+                        build_league,
                         league_id=credentials.league_id,
                         year=credentials.year,
                         espn_s2=cookies['espn_s2'],
                         swid=cookies['swid']
                     )
+                    league_cookies = {"espn_s2": cookies['espn_s2'], "swid": cookies['swid']}
                 else:
                     print("Failed to retrieve cookies")
                 print("✓ Successfully authenticated with username/password")
+            except EspnThrottled:
+                raise
             except Exception as e:
                 print(f"Username/password auth failed: {e}")
+                # the cookies may be cached ones ESPN no longer takes, the next attempt logs in again
+                await run_blocking(extractor.forget_cookies, credentials.username, credentials.password)
         
         # Method 3: Try as public league (no authentication)
         if not league:
             try:
-                league = League(
+                league = await run_blocking(
+                    build_league,
                     league_id=credentials.league_id,
                     year=credentials.year
                 )
                 print("✓ Successfully connected to public league")
+            except EspnThrottled:
+                raise
             except Exception as e:
                 print(f"Public league access failed: {e}")
                 raise HTTPException(
@@ -81,17 +145,19 @@ async def initialize_services(credentials: ESPNCredentials):
                     detail="Failed to access league. Please check your League ID or provide valid credentials for private leagues."
                 )
         
-        # Initialize services with the league
-        current_services = Services(
+        # Initialize services on the league's shared engine, the freshly loaded league only
+        # gets used if nobody from this league has been here recently
+        services = Services(
             league_id=credentials.league_id,
             year=credentials.year,
             espn_s2=credentials.espn_s2,
             swid=credentials.swid,
-            league_instance=league  # Pass the league instance directly
+            # replacing a stale engine carries its box scores over, which is not for the event loop
+            engine=await run_blocking(engines.get, league)
         )
 
         # Verify the services work by checking if we can access team data
-        if current_services.team is None:
+        if services.team is None:
             raise HTTPException(
                 status_code=400, 
                 detail="Unable to access your team data. You may need to provide authentication for private leagues."
@@ -99,19 +165,27 @@ async def initialize_services(credentials: ESPNCredentials):
 
         return {
             "message": "Services initialized successfully",
+            "session_token": sessions.create(services, record={
+                "league_id": credentials.league_id,
+                "year": credentials.year,
+                **league_cookies,
+                "team_id": services.team.team_id
+            }),
             "auth_method": "cookies" if credentials.espn_s2 and credentials.swid else 
                          "username/password" if credentials.username and credentials.password else "public",
-            "league_name": getattr(league.settings, 'name', 'Unknown League')
+            "league_name": league.name
         }
 
     except HTTPException:
         raise
+    except EspnThrottled as e:
+        raise _throttled(e)
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Initialization failed: {str(e)}")
 
 
 @router.get("/league/info")
-async def get_league_info():
+async def get_league_info(current_services: Optional[Services] = Depends(get_current_services)):
     """Get basic league information to verify connection"""
     try:
         if current_services is None:
@@ -119,19 +193,22 @@ async def get_league_info():
         
         league = current_services.league
         return {
-            "league_name": getattr(league.settings, 'name', 'Unknown League'),
+            "league_name": league.name,
             "league_id": league.league_id,
             "year": league.year,
             "team_count": len(league.teams),
             "current_week": getattr(league, 'current_week', 'Unknown'),
-            "your_team": current_services.team.team_name if current_services.team else "Unknown"
+            "your_team": current_services.team.team_name if current_services.team else "Unknown",
+            "box_score_cache": current_services.box_score_cache.stats()
         }
+    except EspnThrottled as e:
+        raise _throttled(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.get("/test-connection")
-async def test_connection():
+async def test_connection(current_services: Optional[Services] = Depends(get_current_services)):
     """Test if the current connection is working"""
     try:
         if current_services is None:
@@ -139,7 +216,7 @@ async def test_connection():
         
         # Try to access basic data
         team_name = current_services.team.team_name if current_services.team else "No team found"
-        league_name = getattr(current_services.league.settings, 'name', 'Unknown League')
+        league_name = current_services.league.name
         
         return {
             "status": "connected",
@@ -147,98 +224,122 @@ async def test_connection():
             "league": league_name,
             "message": "Connection is working properly"
         }
+    except EspnThrottled as e:
+        raise _throttled(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Connection test failed: {str(e)}")
 
 
 # All your existing endpoints remain the same
 @router.get("/team/find-trae")
-async def find_trae_young_route():
+async def find_trae_young_route(current_services: Optional[Services] = Depends(get_current_services)):
     try:
         if current_services is None:
             raise HTTPException(status_code=400, detail="Services not initialized. Call /initialize first.")
         return current_services.find_trae_young()
+    except EspnThrottled as e:
+        raise _throttled(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.get("/team/weekly-average")
-async def get_weekly_average_route():
+async def get_weekly_average_route(current_services: Optional[Services] = Depends(get_current_services)):
     try:
         if current_services is None:
             raise HTTPException(status_code=400, detail="Services not initialized. Call /initialize first.")
         return current_services.get_weekly_average()
+    except EspnThrottled as e:
+        raise _throttled(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.get("/team/best-week")
-async def get_best_week_route():
+async def get_best_week_route(current_services: Optional[Services] = Depends(get_current_services)):
     try:
         if current_services is None:
             raise HTTPException(status_code=400, detail="Services not initialized. Call /initialize first.")
         best_week, best_score = current_services.get_best_week()
         return f"Week: {best_week}, Score: {int(best_score)}"
+    except EspnThrottled as e:
+        raise _throttled(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.get("/team/worst-week")
-async def get_worst_week_route():
+async def get_worst_week_route(current_services: Optional[Services] = Depends(get_current_services)):
     try:
         if current_services is None:
             raise HTTPException(status_code=400, detail="Services not initialized. Call /initialize first.")
         worst_week, worst_score = current_services.get_worst_week()
         return f"Week: {worst_week}, Score: {int(worst_score)}"
+    except EspnThrottled as e:
+        raise _throttled(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.get("/team/longest-streak")
-async def get_longest_streak_route():
+async def get_longest_streak_route(current_services: Optional[Services] = Depends(get_current_services)):
     try:
         if current_services is None:
             raise HTTPException(status_code=400, detail="Services not initialized. Call /initialize first.")
         wins, loss = current_services.get_longest_streak()
         return f"Longest Win Streak: {wins}, Longest Loss Streak: {loss}"
+    except EspnThrottled as e:
+        raise _throttled(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.get("/team/sleeper")
-async def get_sleeper_star_route():
+async def get_sleeper_star_route(current_services: Optional[Services] = Depends(get_current_services)):
     try:
         if current_services is None:
             raise HTTPException(status_code=400, detail="Services not initialized. Call /initialize first.")
-        name, actual, projected = current_services.get_sleeper_star()
+        result = current_services.get_sleeper_star()
+        if isinstance(result, str):
+            return result
+        name, actual, projected = result
         return f"Name: {name}, Average: {actual}, Projected: {projected}"
+    except EspnThrottled as e:
+        raise _throttled(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.get("/team/bust")
-async def get_bust_route():
+async def get_bust_route(current_services: Optional[Services] = Depends(get_current_services)):
     try:
         if current_services is None:
             raise HTTPException(status_code=400, detail="Services not initialized. Call /initialize first.")
-        name, actual, projected = current_services.get_bust()
+        result = current_services.get_bust()
+        if isinstance(result, str):
+            return result
+        name, actual, projected = result
         return f"Name: {name}, Average: {actual}, Projected: {projected}"
+    except EspnThrottled as e:
+        raise _throttled(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.get("/team/clutch")
-async def find_clutch_player_route():
+async def find_clutch_player_route(current_services: Optional[Services] = Depends(get_current_services)):
     try:
         if current_services is None:
             raise HTTPException(status_code=400, detail="Services not initialized. Call /initialize first.")
-        return current_services.find_clutch_player()
+        return await run_blocking(current_services.find_clutch_player)
+    except EspnThrottled as e:
+        raise _throttled(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.get("/team/best-matchup")
-async def find_best_team_matchup_route():
+async def find_best_team_matchup_route(current_services: Optional[Services] = Depends(get_current_services)):
     try:
         if current_services is None:
             raise HTTPException(status_code=400, detail="Services not initialized. Call /initialize first.")
@@ -247,12 +348,14 @@ async def find_best_team_matchup_route():
             return result
         team, wins = result
         return f"Team: {team}, Wins: {wins}, Losses: {4 - wins}"
+    except EspnThrottled as e:
+        raise _throttled(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.get("/team/worst-matchup")
-async def find_worst_team_matchup_route():
+async def find_worst_team_matchup_route(current_services: Optional[Services] = Depends(get_current_services)):
     try:
         if current_services is None:
             raise HTTPException(status_code=400, detail="Services not initialized. Call /initialize first.")
@@ -261,46 +364,175 @@ async def find_worst_team_matchup_route():
             return result
         team, losses = result
         return f"Team: {team}, Wins: {4 - losses}, Losses: {losses}"
+    except EspnThrottled as e:
+        raise _throttled(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     
 
 @router.get("/team/biggest-comeback")
-async def get_biggest_comeback_route():
+async def get_biggest_comeback_route(current_services: Optional[Services] = Depends(get_current_services)):
     try:
         if current_services is None:
             raise HTTPException(status_code=400, detail="Services not initialized. Call /initialize first.")
-        comeback_deficit, week, opponent = current_services.get_biggest_comeback()
+        comeback_deficit, week, opponent = await run_blocking(current_services.get_biggest_comeback)
         return f"Week: {week}, Opponent: {opponent.team_name if hasattr(opponent, 'team_name') else opponent}, Deficit: {comeback_deficit}"
+    except EspnThrottled as e:
+        raise _throttled(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     
 
 @router.get("/team/bonus-titles")
-async def bonus_titles_route():
+async def bonus_titles_route(current_services: Optional[Services] = Depends(get_current_services)):
     try:
         if current_services is None:
             raise HTTPException(status_code=400, detail="Services not initialized. Call /initialize first.")
-        titles = current_services.bonus_title()
+        # the titles read the league's streaks and may wait on another request building them
+        titles = await run_blocking(current_services.bonus_title)
         return ", ".join(titles)
+    except EspnThrottled as e:
+        raise _throttled(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.get("/team/missing-points")
-async def missing_points_route():
+async def missing_points_route(current_services: Optional[Services] = Depends(get_current_services)):
     try:
         if current_services is None:
             raise HTTPException(status_code=400, detail="Services not initialized. Call /initialize first.")
-        missing_points = current_services.missing_points()
+        missing_points = await run_blocking(current_services.missing_points)
         return str(missing_points)
+    except EspnThrottled as e:
+        raise _throttled(e)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/team/lineup-report")
+async def lineup_report_route(current_services: Optional[Services] = Depends(get_current_services)):
+    """Actual versus best possible lineup points for each week and day"""
+    try:
+        if current_services is None:
+            raise HTTPException(status_code=400, detail="Services not initialized. Call /initialize first.")
+        return await run_blocking(current_services.get_lineup_report)
+    except EspnThrottled as e:
+        raise _throttled(e)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/wrapped")
+async def wrapped_route(current_services: Optional[Services] = Depends(get_current_services)):
+    """Every wrapped stat in a single response"""
+    try:
+        if current_services is None:
+            raise HTTPException(status_code=400, detail="Services not initialized. Call /initialize first.")
+        return await run_blocking(current_services.wrapped)
+    except EspnThrottled as e:
+        raise _throttled(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.post("/jobs/wrapped")
+async def wrapped_job_route(current_services: Optional[Services] = Depends(get_current_services)):
+    """Queue the wrapped report and return its job id right away, poll /jobs/{job_id} for progress and the result"""
+    if current_services is None:
+        raise HTTPException(status_code=400, detail="Services not initialized. Call /initialize first.")
+    league, team = current_services.league, current_services.team
+    # managers of the same team asking at once share one job
+    key = ("wrapped", league.league_id, league.year, getattr(team, "team_id", None))
+    try:
+        job = jobs.submit(key, lambda progress: current_services.wrapped(progress=progress))
+    except QueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "30"})
+    return job.to_dict()
+
+
+@router.get("/jobs/{job_id}")
+async def get_job_route(job_id: str):
+    """Status and progress of a queued job, with its result once done"""
+    job = jobs.snapshot(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found or expired")
+    return job
+
+
+@router.get("/sessions/stats")
+async def session_stats_route():
+    """Session store occupancy, hit/miss and eviction counts"""
+    return {**sessions.stats(), "league_engines": engines.stats(), "league_builds": league_builds.stats(), "jobs": jobs.stats(),
+            "cookie_cache": cookie_cache.stats(), "espn_transport": espn_transport.stats()}
+
+
+def _stat_line(name: str, build) -> str:
+    try:
+        return json.dumps({"stat": name, "value": build()}) + "\n"
+    except Exception as e:
+        return json.dumps({"stat": name, "error": str(e)}) + "\n"
+
+
+async def _stream_wrapped(services: Services):
+    precomputed = await run_blocking(services.engine.precomputed, services.team) if services.engine else None
+    if precomputed:
+        for name, value in precomputed.items():
+            # stats that failed while the league was swept are stored as {"error": message}
+            if isinstance(value, dict) and "error" in value:
+                yield json.dumps({"stat": name, "error": value["error"]}) + "\n"
+            else:
+                yield json.dumps({"stat": name, "value": value}) + "\n"
+        return
+
+    stats = services.wrapped_stats()
+    # box score stats start right away on the executor while the schedule based ones are sent
+    heavy = [
+        asyncio.ensure_future(run_blocking(_stat_line, name, build))
+        for name, (needs_box_scores, build) in stats.items() if needs_box_scores
+    ]
+    for name, (needs_box_scores, build) in stats.items():
+        if not needs_box_scores:
+            # light stats too, a shared value they read may be built by another request's sweep
+            yield await run_blocking(_stat_line, name, build)
+    for line in asyncio.as_completed(heavy):
+        yield await line
+
+
+@router.get("/wrapped/stream")
+async def wrapped_stream_route(current_services: Optional[Services] = Depends(get_current_services)):
+    """Wrapped stats as newline delimited JSON, one {"stat", "value"} line per stat as soon as it is ready"""
+    if current_services is None:
+        raise HTTPException(status_code=400, detail="Services not initialized. Call /initialize first.")
+    return StreamingResponse(_stream_wrapped(current_services), media_type="application/x-ndjson")
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+def metrics_route():
+    """ESPN call counts and timings and route latencies in the Prometheus text format"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+@router.get("/profiles")
+def profiles_route():
+    """Recently captured request profiles, newest first. Needs PROFILING_ENABLED=1"""
+    if not profiling.PROFILING_ENABLED:
+        raise HTTPException(status_code=404, detail="Profiling is disabled")
+    return profiling.summaries()
+
+
+@router.get("/profiles/{profile_id}", response_class=PlainTextResponse)
+def profile_route(profile_id: str):
+    """Collapsed stacks of one profiled request, ready for flamegraph.pl or speedscope"""
+    profile = profiling.get(profile_id) if profiling.PROFILING_ENABLED else None
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return PlainTextResponse(profile.collapsed())
+
+
 @router.post("/reset")
-async def reset_services():
-    """Reset the current services instance"""
-    global current_services
-    current_services = None
+async def reset_services(authorization: Optional[str] = Header(None)):
+    """End the caller's session"""
+    _, _, token = (authorization or "").partition(" ")
+    sessions.delete(token.strip())
     return {"message": "Services reset successfully"}
\ No newline at end of file
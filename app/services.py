@@ -1,9 +1,28 @@
 from __future__ import annotations
 
+import threading
 import time
-from espn_api.basketball import * 
+import numpy as np
 import requests
 
+from app.cache import BoxScoreCache
+from app.espn import build_league
+from app.lineups import LineupIndex
+from app.matrix import DailyScoreIndex, ScoreMatrix
+from app.records import BoxScoreRecord, TeamRecord
+from app.singleflight import SingleFlight
+from app.transport import EspnThrottled
+
+# rough bytes held by one PlayerRecord including its numbers and its place in a lineup, used to size sessions and engines
+APPROX_PLAYER_BYTES = 400
+
+
+def approx_league_bytes(league, box_score_cache: BoxScoreCache) -> int:
+    """Rough bytes held by a loaded league's rosters and the box scores cached for it"""
+    roster_players = sum(len(team.roster) for team in league.teams)
+    return (roster_players + box_score_cache.player_count()) * APPROX_PLAYER_BYTES
+
+
 # stats does not include playoffs
 # reminder to check cases where diff settings might affect methods (baby proof it)
 class Services:
@@ -11,26 +30,100 @@ class Services:
     # league_id is specific to league, year is season year, espn_s2 and swid are cookies
     # espn_s2 grants permission to access fantasy league data
     # swid is specific to user and allows us to idenitfy which team is theirs
-    def __init__(self, league_id: int, year: int, espn_s2: str, swid: str, league_instance=None):
-        if league_instance:
+    # engine is the LeagueEngine shared by every manager of the league, team skips the swid lookup
+    def __init__(self, league_id: int, year: int, espn_s2: str, swid: str, league_instance=None, engine=None, team=None):
+        self.engine = engine
+        if engine:
+            self.league = engine.league
+        elif league_instance:
             self.league = league_instance
         else :
-            self.league = League(
+            self.league = build_league(
             league_id=league_id,
             year=year,
             espn_s2=espn_s2,
             swid=swid
             )
-        self.team = None
-        
+        self.team = team
+        if engine:
+            self.box_score_cache = engine.box_score_cache
+            self.score_matrix = engine.score_matrix
+            self._derived = engine.derived
+            self._derived_lock = engine.derived_lock
+            self._derived_builds = engine.derived_builds
+            self._lineup_days = engine.lineup_days
+        else:
+            # shared by every box score based stat so each scoring period is fetched once
+            self.box_score_cache = BoxScoreCache(self.league)
+            # team x matchup period arrays behind every schedule based stat
+            self.score_matrix = ScoreMatrix(self.league)
+            # league wide values built from the above, like bonus title holders and the daily score index
+            self._derived = {}
+            self._derived_lock = threading.Lock()
+            # concurrent stats needing the same value wait for one build instead of each sweeping box scores
+            self._derived_builds = SingleFlight()
+            # (matchup_period, scoring_period) -> {team_id: (actual, optimal)} lineup points, see LineupIndex
+            self._lineup_days = {}
+
+        if team is not None:
+            return
+
         for team in self.league.teams:
-            for user in team.owners:
-                if swid == user.get('id'):
-                    self.team = team
+            if swid in team.owner_ids:
+                self.team = team
 
         if self.team is None:
             print("User's team not found in this league.")
 
+    def approx_size(self) -> int:
+        """Bytes only this session holds, a shared engine's league and box scores are charged to the engine"""
+        if self.engine:
+            return 0
+        return approx_league_bytes(self.league, self.box_score_cache)
+
+    def _find_team_box_score(self, games: list[BoxScoreRecord], team=None) -> BoxScoreRecord | None:
+        team = team or self.team
+        for matchup in games:
+            if team in (matchup.home_team, matchup.away_team):
+                return matchup
+        return None
+
+    # league wide values every manager shares, built once and kept on the engine when there is one
+    def _shared(self, name: str, build):
+        with self._derived_lock:
+            if name in self._derived:
+                return self._derived[name]
+        # builds sweep box scores, so they are coalesced per name and never run under the lock other stats read through
+        return self._derived_builds.do(name, self._build_shared, name, build)
+
+    def _build_shared(self, name: str, build):
+        with self._derived_lock:
+            if name in self._derived:
+                return self._derived[name]
+        value = build()
+        # a released engine's values were just cleared, keeping this one would undo that
+        if self.engine is None or not self.engine.released:
+            with self._derived_lock:
+                self._derived[name] = value
+        return value
+
+    # the scoring periods of every matchup period, with the box scores of the ones already started fetched in one sweep
+    def _season_box_scores(self) -> tuple[list[list[tuple[int, int]]], dict]:
+        days_by_week = [self.league.calendar.pairs(i + 1) for i in range(self.score_matrix.points_for.shape[1])]
+        box_scores = self.box_score_cache.prefetch(
+            period for days in days_by_week for period in days if self.box_score_cache.is_started(period[1])
+        )
+        return days_by_week, box_scores
+
+    def daily_index(self) -> DailyScoreIndex:
+        return self._shared("daily_index", lambda: DailyScoreIndex(self.score_matrix, *self._season_box_scores()))
+
+    def lineup_index(self) -> LineupIndex:
+        # lineup_slot_counts is set by build_league, otherwise the slots are inferred from the lineups
+        slot_counts = getattr(self.league, 'lineup_slot_counts', None)
+        return self._shared("lineup_index", lambda: LineupIndex(self.score_matrix, *self._season_box_scores(), slot_counts,
+                                                                day_totals=self._lineup_days))
+
     def find_trae_young(self) -> str:
 
         #Im gonna find trae young!
@@ -41,49 +134,21 @@ class Services:
         return "didn't find trae young aw man"
 
 
-    def get_weekly_average(self) -> float: 
-        return self.team.points_for / 20 
+    # ESPN's points_for covers the regular season matchups played so far
+    def get_weekly_average(self) -> float:
+        weeks = self.score_matrix.played_weeks(self.team)
+        return self.team.points_for / weeks if weeks else 0
 
     def get_best_week(self) -> tuple[int, int]:
-        best_week = 0
-        best_score = 0
-        for week in range(20):
-            score = self.team.schedule[week].home_final_score if (self.team == self.team.schedule[week].home_team) else self.team.schedule[week].away_final_score 
-            if score > best_score:
-                best_week = week + 1
-                best_score = score
-        return best_week, best_score
+        return self.score_matrix.best_week(self.team)
 
     def get_worst_week(self) -> tuple[int, int]:
-        worst_week = 0
-        worst_score = float('inf')
-        for week in range(20):
-            score = self.team.schedule[week].home_final_score if (self.team == self.team.schedule[week].home_team) else self.team.schedule[week].away_final_score
-            if score < worst_score:
-                worst_week = week + 1
-                worst_score = score 
-        return worst_week, worst_score
+        return self.score_matrix.worst_week(self.team)
 
     def get_longest_streak(self, team=None) -> tuple[int, int]:
-        win_count = 0
-        max_win = 0
-        loss_count = 0
-        max_loss = 0
-        team = team or self.team
-        for matchup in team.schedule:
-            if (matchup.home_team == team and matchup.winner == 'HOME') or (matchup.home_team != team and matchup.winner == 'AWAY'):
-                win_count += 1
-                loss_count = 0
-            else:
-                win_count = 0
-                loss_count += 1
-
-            max_win = max(max_win, win_count)
-            max_loss = max(max_loss, loss_count)
-            
-        return max_win, max_loss
+        return self.score_matrix.longest_streak(team or self.team)
 
-    def get_sleeper_star(self) -> tuple[str, float, float]:
+    def get_sleeper_star(self) -> tuple[str, float, float] | str:
         sleeper = None
         final_diff = 0
         for player in self.team.roster:
@@ -91,9 +156,11 @@ class Services:
             if new_combined_diff > final_diff:
                 final_diff = new_combined_diff
                 sleeper = player
+        if sleeper is None:
+            return "No sleeper found. nobody beat their projections"
         return sleeper.name, sleeper.avg_points, sleeper.projected_avg_points
 
-    def get_bust(self) -> tuple[str, float, float]: 
+    def get_bust(self) -> tuple[str, float, float] | str:
         bust = None
         final_diff = 0
         for player in self.team.roster:
@@ -101,131 +168,72 @@ class Services:
             if new_combined_diff > final_diff:
                 final_diff = new_combined_diff
                 bust = player
+        if bust is None:
+            return "No bust found. everyone lived up to the hype"
         return bust.name, bust.avg_points, bust.projected_avg_points
 
-    def find_clutch_player(self) -> Player | str:
-        point_diff_threshold = 100
+    # regular season wins decided by at most point_diff_threshold points
+    def _close_wins(self, point_diff_threshold: int = 100) -> list[int]:
+        return self.score_matrix.close_wins(self.team, point_diff_threshold)
+
+    def find_clutch_player(self) -> str:
         count = {}
-        matchup_end_periods = [
-        6, 13, 20, 27, 34, 41, 48, 55, 62, 69, 76, 83, 90, 97, 104, 111, 118, 132, 139, 146
-        ]
+        # the last day of every close win decides who was clutch
+        last_days = [(i + 1, self.league.calendar.last_day(i + 1)) for i in self._close_wins()]
+        last_days = [period for period in last_days if period[1] is not None]
+        box_scores = self.box_score_cache.prefetch(last_days)
 
-        for i in range(20):
+        for period in last_days:
             max_diff = -1
             clutch_player = None
 
-            matchup_obj = self.team.schedule[i]
-            is_home = matchup_obj.home_team == self.team
-            is_winner = (is_home and matchup_obj.winner == 'HOME') or (not is_home and matchup_obj.winner == 'AWAY')
-
-            if is_winner:
-                point_diff = abs(matchup_obj.home_final_score - matchup_obj.away_final_score)
-
-                if point_diff <= point_diff_threshold:
-                    end_period = matchup_end_periods[i]
+            box_score = self._find_team_box_score(box_scores[period])
 
-                    final_games = self.league.box_scores(matchup_period=i + 1, scoring_period=end_period, matchup_total=False)
+            if box_score:
+                lineup = box_score.home_lineup if box_score.home_team == self.team else box_score.away_lineup
 
-                    box_score = None
-                    for matchup in final_games:
-                        if self.team in (matchup.home_team, matchup.away_team):
-                            box_score = matchup
-                            break
+                for player in lineup:
+                    # whichever player performed the most better than usual 
+                    if (player.slot_position not in ['BE', 'IR'] and player.points > max_diff and player.points > player.avg_points):
+                        max_diff = player.points - player.avg_points
+                        clutch_player = player
 
-                    if box_score:
-                        lineup = box_score.home_lineup if box_score.home_team == self.team else box_score.away_lineup
-
-                        for player in lineup:
-                            # whichever player performed the most better than usual 
-                            if (player.slot_position not in ['BE', 'IR'] and player.points > max_diff and player.points > player.avg_points):
-                                max_diff = player.points - player.avg_points
-                                clutch_player = player
-
-                        if clutch_player:
-                            count[clutch_player] = count.get(clutch_player, 0) + 1
+                if clutch_player:
+                    count[clutch_player] = count.get(clutch_player, 0) + 1
 
         return max(count, key=count.get).name if count else "No clutch player found. you drafted tatum?"
 
     def find_best_team_matchup(self) -> tuple[str, int]:
-        win_counts = {}
-
-        for matchup in self.team.schedule[:20]:
-            home_score = matchup.home_final_score
-            away_score = matchup.away_final_score
-
-            if matchup.home_team == self.team and home_score > away_score:
-                win_counts[matchup.away_team] = win_counts.get(matchup.away_team, 0) + 1
-            elif matchup.away_team == self.team and away_score > home_score:
-                win_counts[matchup.home_team] = win_counts.get(matchup.home_team, 0) + 1
+        best = self.score_matrix.best_matchup(self.team)
 
-        if not win_counts:
+        if best is None:
             return "How did you not win a single game you bum. quit."
 
-        best_opponent = max(win_counts, key=win_counts.get)
-        return best_opponent.team_name, win_counts[best_opponent]
+        best_opponent, wins = best
+        return best_opponent.team_name, wins
 
     def find_worst_team_matchup(self) -> tuple[str, int]:
-        loss_counts = {}
+        worst = self.score_matrix.worst_matchup(self.team)
 
-        for matchup in self.team.schedule[:20]:
-            home_score = matchup.home_final_score
-            away_score = matchup.away_final_score
-
-            if matchup.home_team == self.team and home_score < away_score:
-                loss_counts[matchup.away_team] = loss_counts.get(matchup.away_team, 0) + 1
-            elif matchup.away_team == self.team and away_score < home_score:
-                loss_counts[matchup.home_team] = loss_counts.get(matchup.home_team, 0) + 1
-
-        if not loss_counts:
+        if worst is None:
             return "Maybe your the goat, maybe ur name is jacob. Maybe both"
 
-        worst_opponent = max(loss_counts, key=loss_counts.get)
-        return worst_opponent.team_name, loss_counts[worst_opponent]
+        worst_opponent, losses = worst
+        return worst_opponent.team_name, losses
     
-    def get_biggest_comeback(self) -> tuple[int, int, Team]:
-        # works now but takes forever
-        # for some reason if i try to cache the box scores to make it quicker it stops working idk idk idk idk ikd idk idk idk idk
-
-        opponent = None
-        comeback_amount = -1
-        week = -1
-        for i in range(len(self.team.schedule)):
-            max_diff = -1
-
-            matchup_obj = self.team.schedule[i]
-            is_home = matchup_obj.home_team == self.team
-            is_winner = (is_home and matchup_obj.winner == 'HOME') or (not is_home and matchup_obj.winner == 'AWAY')
-
-            if is_winner:
-                for_cum = 0
-                opp_cum = 0
-                if i == 16:
-                    week_count = 14
-                else:
-                    week_count = 7
-                for j in range(week_count):
-                    games = self.league.box_scores(matchup_period=i + 1, scoring_period=j + i * 7, matchup_total=False)
-                    box_score = None
-                    for matchup in games:
-                        if self.team in (matchup.home_team, matchup.away_team):
-                            box_score = matchup
-                            break
-
-                    if box_score:
-                        for_cum += box_score.home_score if box_score.home_team == self.team else box_score.away_score
-                        opp_cum += box_score.away_score if box_score.home_team == self.team else box_score.home_score
-                        if opp_cum - for_cum > comeback_amount:
-                            comeback_amount = opp_cum - for_cum
-                            week = i + 1
-                            opponent = box_score.away_team if box_score.home_team == self.team else box_score.home_team
-
-                       
-
+    def get_biggest_comeback(self) -> tuple[int, int, TeamRecord]:
+        comeback_amount, week, opponent = self.daily_index().biggest_comeback(self.team)
         return int(comeback_amount), week, opponent
 
-    def bonus_title(self, team=None) -> list[str]:
-        titles = []
+    def get_biggest_blown_lead(self) -> tuple[int, int, TeamRecord]:
+        blown_lead, week, opponent = self.daily_index().biggest_blown_lead(self.team)
+        return int(blown_lead), week, opponent
+
+    def get_lead_changes(self) -> int:
+        return self.daily_index().lead_changes(self.team)
 
+    # every bonus title in one pass over the league, so each team's titles are just lookups
+    def _compute_title_holders(self) -> dict[str, set[int]]:
         max_over = -1
         max_under = -1
         underdog = None
@@ -266,73 +274,117 @@ class Services:
                 max_diff_minus = team.points_against - team.points_for
                 toughie = team
 
-            
-            
-        if underdog == self.team:
-            titles.append("underdog")
-        if overrated == self.team:
-            titles.append("overrated")
-        if cakewalk == self.team:
-            titles.append("cakewalk")
-        if toughie == self.team:
-            titles.append("toughie")
-        if quick_hands == self.team:
-            titles.append("quick hands")
-        
-        max_win, max_loss = self.get_longest_streak()
-        break_win = False
-        break_loss = False
-        for team in self.league.teams:
-            else_win, else_loss = self.get_longest_streak(team)
-            if max_win < else_win:
-                break_win = True
-            if max_loss < else_loss:
-                break_loss = True
-            if break_win and break_loss:
-                break
-        if not break_win:
-            titles.append("longest win streak")
-        if not break_loss:
-            titles.append("longest loss streak")
+        holders = {}
+        for title, team in [("underdog", underdog), ("overrated", overrated), ("cakewalk", cakewalk),
+                            ("toughie", toughie), ("quick hands", quick_hands)]:
+            holders[title] = {team.team_id} if team else set()
+
+        # ties share the streak titles, streaks for the whole league come straight off the score matrix
+        matrix = self.score_matrix
+        holders["longest win streak"] = {matrix.teams[row].team_id for row in np.flatnonzero(matrix.win_streaks == matrix.win_streaks.max())}
+        holders["longest loss streak"] = {matrix.teams[row].team_id for row in np.flatnonzero(matrix.loss_streaks == matrix.loss_streaks.max())}
+        return holders
+
+    def bonus_title(self, team=None) -> list[str]:
+        team = team or self.team
+        title_holders = self._shared("title_holders", self._compute_title_holders)
 
+        titles = [title for title, team_ids in title_holders.items() if team.team_id in team_ids]
 
         if len(titles) == 0:
             titles.append("participation trophy")
         return titles
             
-    # might cause error with leagues that have custom roster settings
-    # slow because iterating through each player in lineup of each day of each week
-    def missing_points(self) -> int:
-        total_points = 0
-        for i in range(len(self.team.schedule)):
-            if i == 16:
-                week = 14
-            else: 
-                week = 7
-            for j in range(week): #special case for the two week matchups!!!!! fix for combeack method as well
-                counter = 0
-                potential_points = 0
-                games = self.league.box_scores(matchup_period=i + 1, scoring_period=j + i * 7, matchup_total=False)
-                box_score = None
-                for matchup in games:
-                    if self.team in (matchup.home_team, matchup.away_team):
-                        box_score = matchup
-                        break
-
-                if box_score:
-                    for player in box_score.home_lineup:
-                        if player.slot_position != "BE" and player.slot_position != "IR" and player.points != 0:
-                            counter += 1
-                        if player.slot_position == "BE" or player.slot_position == "IR":
-                            potential_points += player.points
-                    
-                    if counter < 10:
-                        total_points += potential_points
-        
-        return total_points
+    # points the best possible lineup would have scored on top of the one that was set, over every day of the season
+    def missing_points(self) -> float:
+        return round(self.lineup_index().missing(self.team), 2)
+
+    def get_lineup_report(self) -> list[dict]:
+        return self.lineup_index().report(self.team)
+
+    # every box score period any stat needs, so the wrapped report can sweep them in one go
+    def _wrapped_periods(self) -> list[tuple[int, int]]:
+        calendar = self.league.calendar
+        periods = [(i + 1, calendar.last_day(i + 1)) for i in self._close_wins() if calendar.last_day(i + 1) is not None]
+        periods += [period for i in range(len(self.team.schedule)) for period in calendar.pairs(i + 1)]
+        return [period for period in periods if self.box_score_cache.is_started(period[1])]
+
+    def wrapped(self, progress=None) -> dict:
+        """Full wrapped report, served from the league's precomputed results when there is an engine.
+
+        progress(done, total) is called as box score periods are fetched.
+        """
+        if self.engine:
+            return self.engine.wrapped(self.team, progress)
+        self.box_score_cache.prefetch(self._wrapped_periods(), progress=progress)
+        return self.compute_wrapped()
+
+    def compute_wrapped(self) -> dict:
+        """Build the report, expects the box scores from _wrapped_periods to already be cached.
+
+        A stat that fails is reported as {"error": message} so it does not take the
+        rest of the report, or the rest of the league's, down with it. ESPN being
+        unreachable is not a stat failure and is raised.
+        """
+        report = {}
+        for name, (_, build) in self.wrapped_stats().items():
+            try:
+                report[name] = build()
+            except (EspnThrottled, requests.RequestException):
+                raise
+            except Exception as e:
+                report[name] = {"error": str(e)}
+        return report
+
+    def wrapped_stats(self) -> dict[str, tuple[bool, callable]]:
+        """Every stat of the wrapped report as name -> (needs box scores, function building its JSON value)"""
+
+        def team_name(team):
+            return team.team_name if hasattr(team, 'team_name') else team
+
+        def week_score(result):
+            week, score = result
+            return {"week": week, "score": int(score)}
+
+        def streak():
+            max_win, max_loss = self.get_longest_streak()
+            return {"wins": max_win, "losses": max_loss}
+
+        def player_average(result):
+            if isinstance(result, str):
+                return result
+            name, average, projected = result
+            return {"name": name, "average": average, "projected": projected}
+
+        def matchup(result, count_label):
+            return result if isinstance(result, str) else {"team": result[0], count_label: result[1]}
+
+        def comeback():
+            deficit, week, opponent = self.get_biggest_comeback()
+            return {"week": week, "opponent": team_name(opponent), "deficit": deficit}
+
+        def blown_lead():
+            lead, week, opponent = self.get_biggest_blown_lead()
+            return {"week": week, "opponent": team_name(opponent), "lead": lead}
+
+        return {
+            "trae": (False, self.find_trae_young),
+            "weekly_average": (False, self.get_weekly_average),
+            "best_week": (False, lambda: week_score(self.get_best_week())),
+            "worst_week": (False, lambda: week_score(self.get_worst_week())),
+            "longest_streak": (False, streak),
+            "sleeper": (False, lambda: player_average(self.get_sleeper_star())),
+            "bust": (False, lambda: player_average(self.get_bust())),
+            "clutch": (True, self.find_clutch_player),
+            "best_matchup": (False, lambda: matchup(self.find_best_team_matchup(), "wins")),
+            "worst_matchup": (False, lambda: matchup(self.find_worst_team_matchup(), "losses")),
+            "biggest_comeback": (True, comeback),
+            "biggest_blown_lead": (True, blown_lead),
+            "lead_changes": (True, self.get_lead_changes),
+            "bonus_titles": (False, self.bonus_title),
+            "missing_points": (True, self.missing_points)
+        }
+
 
-       
-    
-    
 # my swid used for testing 
 # s = Services(league_id=332773775, year=2025, espn_s2='AEB%2FraVAzJUuPQQx%2FZbZyHlQBgCLq%2FRJZeRW%2FD2PS9L1c89tj7UCmG7Y8jGvoYKhToVRtrWmOV8wHyGr8PkOlQJ%2Bc6WyPrTJHE8s2fgroHPV2Z3vA3Hp1QbO0ZlHFu0YvNBT1OMvExX1l7vPZPi5Is4Fmqx8AJDu8aGb5sdXtY5G1oEJ5imB9sjcwj3QUnA0lBdCWbQ%2BUcs%2FDnBNkWDd%2Fe191amCJFp7S0%2BnH1ut5HMOPlo%2B6gh3FhScoJQNIhqkGL2gQr0Bv0WIrSA%2F7Cg8ywpJPBwCDr9tpfwAmfqFWYzABQ%3D%3D', swid='{1A576FEF-EB0A-4EAC-A122-54A7CB7DD0FF}')
@@ -0,0 +1,190 @@
+from __future__ import annotations
+
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+from app.store import Store
+
+SESSION_MAX = int(os.environ.get("SESSION_MAX", "200"))
+SESSION_TTL_SECONDS = int(os.environ.get("SESSION_TTL_SECONDS", "1800"))
+SESSION_MAX_MB = int(os.environ.get("SESSION_MAX_MB", "1024"))
+# how often a session in use pushes back its expiry in the shared store, in between it is only read
+SESSION_TOUCH_SECONDS = 60
+
+
+class SessionStore:
+    """Bounded token -> value store with least recently used eviction.
+
+    A session is dropped when it has been idle for longer than ttl_seconds, when
+    there are more than max_sessions, or when the summed weight of every session
+    goes over max_bytes. weigh(value) estimates the bytes a value holds and is
+    re-run whenever the session is used, since a session grows as stats are
+    computed.
+
+    With a shared Store, create(value, record) also writes record, a small
+    JSON dict the value can be rebuilt from, under the token. Any worker
+    process then finds the session with record(token) and puts the rebuilt
+    value in its own LRU with adopt(token, value), and delete ends the session
+    in every worker. The record decides whether a token is valid, so a value
+    evicted here just gets rebuilt on its next use.
+
+    Records hold ESPN cookies, so the token itself is never stored: a record
+    is stored under a hash of it and AES-GCM encrypted with a separate key
+    derived from it. Without the bearer token the shared file reads nothing.
+    """
+
+    def __init__(self, max_sessions: int = SESSION_MAX, ttl_seconds: int = SESSION_TTL_SECONDS,
+                 max_bytes: int = SESSION_MAX_MB * 1024 * 1024, weigh=None, shared: Store = None):
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.weigh = weigh or (lambda value: 0)
+        self.shared = shared
+        # token -> [value, last_used, weight, last checked in the shared store or None without a record], oldest first
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.restored = 0
+        self.evictions = {"lru": 0, "ttl": 0, "memory": 0}
+
+    @staticmethod
+    def _key(token: str) -> str:
+        # tokens are 32 random bytes, a plain HMAC is all it takes to make them unguessable from the stored key
+        return f"session:{hmac.new(token.encode(), b'lookup', hashlib.sha256).hexdigest()}"
+
+    @staticmethod
+    def _secret(token: str) -> bytes:
+        return hmac.new(token.encode(), b'session', hashlib.sha256).digest()
+
+    def create(self, value, record: dict = None) -> str:
+        token = secrets.token_urlsafe(32)
+        shared = self.shared is not None and record is not None
+        if shared:
+            key = self._key(token)
+            nonce = os.urandom(12)
+            body = nonce + AESGCM(self._secret(token)).encrypt(nonce, json.dumps(record).encode(), key.encode())
+            self.shared.set(key, body, self.ttl_seconds)
+        self._add(token, value, shared)
+        return token
+
+    def adopt(self, token: str, value):
+        """Keep a value rebuilt from record(token) for the requests that follow"""
+        with self._lock:
+            self.restored += 1
+        self._add(token, value, shared=True)
+
+    def _add(self, token: str, value, shared: bool):
+        weight = self.weigh(value)
+        with self._lock:
+            now = time.monotonic()
+            previous = self._sessions.pop(token, None)
+            if previous is not None:
+                self._bytes -= previous[2]
+            self._sessions[token] = [value, now, weight, now if shared else None]
+            self._bytes += weight
+            self._evict()
+
+    def record(self, token: str) -> dict | None:
+        """What create stored to rebuild the session from, None if it ended or there is no shared store"""
+        if not token or self.shared is None:
+            return None
+        key = self._key(token)
+        body = self.shared.get(key)
+        if body is None:
+            return None
+        try:
+            return json.loads(AESGCM(self._secret(token)).decrypt(body[:12], body[12:], key.encode()))
+        except InvalidTag:
+            return None
+
+    # the token is still valid everywhere, pushing its shared expiry back now and then rather than on every request
+    def _shared_alive(self, token: str, entry: list) -> bool:
+        now = time.monotonic()
+        if now - entry[3] < SESSION_TOUCH_SECONDS:
+            return self.shared.get(self._key(token)) is not None
+        entry[3] = now
+        return self.shared.touch(self._key(token), self.ttl_seconds)
+
+    def get(self, token: str):
+        if not token:
+            return None
+        with self._lock:
+            self._expire()
+            entry = self._sessions.get(token)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._sessions.move_to_end(token)
+            entry[1] = time.monotonic()
+            value = entry[0]
+
+        if entry[3] is not None and not self._shared_alive(token, entry):
+            # ended through another worker, or expired in the shared store
+            self._discard(token)
+            return None
+
+        weight = self.weigh(value)
+        with self._lock:
+            if token in self._sessions:
+                self._bytes += weight - entry[2]
+                entry[2] = weight
+                self._evict(keep=token)
+        return value
+
+    def delete(self, token: str) -> bool:
+        ended = self.shared.delete(self._key(token)) if self.shared is not None and token else False
+        return self._discard(token) or ended
+
+    def _discard(self, token: str) -> bool:
+        with self._lock:
+            entry = self._sessions.pop(token, None)
+            if entry is None:
+                return False
+            self._bytes -= entry[2]
+            return True
+
+    def _drop_oldest(self, reason: str):
+        _, entry = self._sessions.popitem(last=False)
+        self._bytes -= entry[2]
+        self.evictions[reason] += 1
+
+    def _expire(self):
+        cutoff = time.monotonic() - self.ttl_seconds
+        while self._sessions and next(iter(self._sessions.values()))[1] < cutoff:
+            self._drop_oldest("ttl")
+
+    # never evicts keep, the session currently being served, even if it is over the cap on its own
+    def _evict(self, keep: str = None):
+        self._expire()
+        while len(self._sessions) > self.max_sessions and next(iter(self._sessions)) != keep:
+            self._drop_oldest("lru")
+        while self._bytes > self.max_bytes and len(self._sessions) > 1 and next(iter(self._sessions)) != keep:
+            self._drop_oldest("memory")
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._expire()
+            return {
+                "sessions": len(self._sessions),
+                "max_sessions": self.max_sessions,
+                "approx_bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "restored": self.restored,
+                "evictions": dict(self.evictions),
+                "shared_store": self.shared.stats() if self.shared is not None else None
+            }
@@ -0,0 +1,165 @@
+from __future__ import annotations
+
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+
+# SQLite file every uvicorn worker process shares sessions, job status and precomputed reports through,
+# empty keeps them in the process, which is only right with a single worker
+SHARED_STORE_PATH = os.environ.get("SHARED_STORE_PATH", ".cache/shared.sqlite3")
+
+
+class Store(ABC):
+    """Bytes by key with an optional expiry, the backend behind every cache shared between workers.
+
+    A backend implements get, set, touch, delete and purge_expired, one
+    missing any of them fails as soon as it is created. ttl=None means the
+    entry never expires, and an expired entry is never returned even if
+    purge_expired has not removed it yet. shared says whether other processes
+    see what this one writes.
+    """
+
+    shared = False
+
+    @abstractmethod
+    def get(self, key: str) -> bytes | None:
+        raise NotImplementedError
+
+    @abstractmethod
+    def set(self, key: str, value: bytes, ttl: float | None = None):
+        raise NotImplementedError
+
+    @abstractmethod
+    def touch(self, key: str, ttl: float | None = None) -> bool:
+        """Restart the entry's expiry, False if there is no such entry"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete(self, key: str) -> bool:
+        raise NotImplementedError
+
+    @abstractmethod
+    def purge_expired(self) -> int:
+        raise NotImplementedError
+
+    def stats(self) -> dict:
+        return {"backend": type(self).__name__, "shared": self.shared}
+
+
+class MemoryStore(Store):
+    """Store inside this process, for a single worker and for the stand-in and benchmarks"""
+
+    def __init__(self):
+        # key -> (value, expires_at)
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> bytes | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or (entry[1] is not None and entry[1] < time.time()):
+                return None
+            return entry[0]
+
+    def set(self, key: str, value: bytes, ttl: float | None = None):
+        with self._lock:
+            self._entries[key] = (value, None if ttl is None else time.time() + ttl)
+
+    def touch(self, key: str, ttl: float | None = None) -> bool:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or (entry[1] is not None and entry[1] < time.time()):
+                return False
+            self._entries[key] = (entry[0], None if ttl is None else time.time() + ttl)
+            return True
+
+    def delete(self, key: str) -> bool:
+        with self._lock:
+            return self._entries.pop(key, None) is not None
+
+    def purge_expired(self) -> int:
+        now = time.time()
+        with self._lock:
+            expired = [key for key, (_, expires_at) in self._entries.items() if expires_at is not None and expires_at < now]
+            for key in expired:
+                del self._entries[key]
+            return len(expired)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {**super().stats(), "entries": len(self._entries)}
+
+
+class SQLiteStore(Store):
+    """Store in a SQLite file in WAL mode, so every worker process reads what the others wrote.
+
+    Each process opens its own connection. WAL lets readers carry on while one
+    writer commits, and busy_timeout makes a writer wait for another process's
+    write instead of failing with "database is locked".
+    """
+
+    shared = True
+
+    def __init__(self, path: str = SHARED_STORE_PATH, table: str = "entries"):
+        self.path = path
+        self.table = table
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=5)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} ("
+            "key TEXT PRIMARY KEY, body BLOB NOT NULL, expires_at REAL)"
+        )
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> bytes | None:
+        with self._lock:
+            row = self._conn.execute(f"SELECT body, expires_at FROM {self.table} WHERE key = ?", (key,)).fetchone()
+        if row is None or (row[1] is not None and row[1] < time.time()):
+            return None
+        return row[0]
+
+    def set(self, key: str, value: bytes, ttl: float | None = None):
+        expires_at = None if ttl is None else time.time() + ttl
+        with self._lock:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, body, expires_at) VALUES (?, ?, ?)",
+                (key, value, expires_at)
+            )
+
+    def touch(self, key: str, ttl: float | None = None) -> bool:
+        now = time.time()
+        with self._lock:
+            return self._conn.execute(
+                f"UPDATE {self.table} SET expires_at = ? WHERE key = ? AND (expires_at IS NULL OR expires_at >= ?)",
+                (None if ttl is None else now + ttl, key, now)
+            ).rowcount > 0
+
+    def delete(self, key: str) -> bool:
+        with self._lock:
+            return self._conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,)).rowcount > 0
+
+    def purge_expired(self) -> int:
+        with self._lock:
+            return self._conn.execute(
+                f"DELETE FROM {self.table} WHERE expires_at IS NOT NULL AND expires_at < ?", (time.time(),)
+            ).rowcount
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries = self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+        return {**super().stats(), "path": self.path, "entries": entries}
+
+
+def open_store(path: str, table: str = "entries") -> Store:
+    """SQLiteStore at path, or a MemoryStore when path is empty"""
+    return SQLiteStore(path, table) if path else MemoryStore()
+
+
+# sessions, job status and wrapped reports, see SHARED_STORE_PATH
+shared_store = open_store(SHARED_STORE_PATH)
@@ -0,0 +1,260 @@
+from __future__ import annotations
+
+import contextvars
+import os
+import random
+import threading
+import time
+from http.cookiejar import DefaultCookiePolicy
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from app.metrics import espn_retries
+
+# ESPN hosts kept connection pools for, the fantasy API is one host so this rarely matters
+ESPN_POOL_HOSTS = int(os.environ.get("ESPN_POOL_HOSTS", "4"))
+# keep-alive connections per ESPN host, enough for every box score prefetch worker of a few leagues at once
+ESPN_POOL_SIZE = int(os.environ.get("ESPN_POOL_SIZE", "32"))
+# requests beyond ESPN_POOL_SIZE wait for a free connection instead of opening one that is thrown away after
+ESPN_POOL_BLOCK = os.environ.get("ESPN_POOL_BLOCK", "1") == "1"
+# steady ESPN request rate of the whole process, bursts of up to ESPN_RATE_BURST go out at once
+ESPN_RATE_PER_SECOND = float(os.environ.get("ESPN_RATE_PER_SECOND", "50"))
+ESPN_RATE_BURST = int(os.environ.get("ESPN_RATE_BURST", "100"))
+# ceiling of concurrent ESPN requests, the limiter halves its limit on throttling and grows it back towards this
+ESPN_CONCURRENCY_MAX = int(os.environ.get("ESPN_CONCURRENCY_MAX", str(ESPN_POOL_SIZE)))
+# retries of one ESPN call answered with 429, 5xx or a dropped connection
+ESPN_RETRY_ATTEMPTS = int(os.environ.get("ESPN_RETRY_ATTEMPTS", "3"))
+# retries all the ESPN calls of one API request may make together, so a struggling ESPN is not hit harder:
+# ESPN_RETRY_BUDGET to start with, plus ESPN_RETRY_RATIO for every call the request sends
+ESPN_RETRY_BUDGET = int(os.environ.get("ESPN_RETRY_BUDGET", "10"))
+ESPN_RETRY_RATIO = float(os.environ.get("ESPN_RETRY_RATIO", "0.2"))
+# first backoff, doubled on every retry up to ESPN_BACKOFF_MAX_SECONDS and fully jittered
+ESPN_BACKOFF_SECONDS = float(os.environ.get("ESPN_BACKOFF_SECONDS", "0.2"))
+ESPN_BACKOFF_MAX_SECONDS = float(os.environ.get("ESPN_BACKOFF_MAX_SECONDS", "5"))
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class EspnThrottled(Exception):
+    """ESPN kept answering 429 or 5xx past the retries this call or its API request had left"""
+
+    def __init__(self, status: int, retry_after: float):
+        retry_after = max(retry_after, 1)
+        super().__init__(f"ESPN is rate limiting or unavailable (HTTP {status}), try again in {retry_after:.0f}s")
+        self.status = status
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """Process wide request rate limit. take() waits for a token, callers are served in arrival order"""
+
+    def __init__(self, rate: float = ESPN_RATE_PER_SECOND, burst: int = ESPN_RATE_BURST):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def take(self) -> float:
+        """Take a token, returns the seconds spent waiting for it"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            # the token is reserved right away, later callers queue behind it
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0
+        if wait:
+            time.sleep(wait)
+        return wait
+
+
+class AdaptiveLimiter:
+    """Concurrency limit that backs off when ESPN throttles and creeps back up while it does not.
+
+    Additive increase, multiplicative decrease: every successful request adds
+    1/limit, so the limit grows by about one per round of requests, and a
+    throttled one halves it. Only requests sent since the last decrease can
+    halve it again, the ones already in flight were throttled for the same
+    overload.
+    """
+
+    def __init__(self, maximum: int = ESPN_CONCURRENCY_MAX, minimum: int = 1, initial: int = None):
+        self.maximum = maximum
+        self.minimum = minimum
+        self.limit = float(min(initial or 8, maximum))
+        self.in_flight = 0
+        self.decreases = 0
+        self._condition = threading.Condition()
+
+    def acquire(self) -> int:
+        """Wait for a slot, returns the decrease count to hand back to release()"""
+        with self._condition:
+            while self.in_flight >= int(self.limit):
+                self._condition.wait()
+            self.in_flight += 1
+            return self.decreases
+
+    def release(self, acquired_at: int, throttled: bool):
+        with self._condition:
+            self.in_flight -= 1
+            if throttled:
+                if acquired_at == self.decreases:
+                    self.limit = max(self.minimum, self.limit / 2)
+                    self.decreases += 1
+            else:
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            self._condition.notify_all()
+
+
+class RetryBudget:
+    """Retries left to the ESPN calls of one API request, shared by the threads working on it.
+
+    Every call sent earns ratio of a retry, so a request making hundreds of
+    calls may retry more of them than one making a few, but never more than
+    about ratio of its calls once the starting retries are gone.
+    """
+
+    def __init__(self, retries: int = ESPN_RETRY_BUDGET, ratio: float = ESPN_RETRY_RATIO):
+        self.left = float(retries)
+        self.ratio = ratio
+        self._lock = threading.Lock()
+
+    def earn(self):
+        with self._lock:
+            self.left += self.ratio
+
+    def spend(self) -> bool:
+        with self._lock:
+            if self.left < 1:
+                return False
+            self.left -= 1
+            return True
+
+
+# set per API request next to the request's timing, calls outside one only get ESPN_RETRY_ATTEMPTS
+current_retry_budget = contextvars.ContextVar("current_retry_budget", default=None)
+
+
+def _backoff(attempt: int, response: requests.Response = None) -> float:
+    # full jitter keeps retries of requests that failed together from arriving together again
+    delay = random.uniform(0, min(ESPN_BACKOFF_MAX_SECONDS, ESPN_BACKOFF_SECONDS * 2 ** attempt))
+    retry_after = response.headers.get("Retry-After") if response is not None else None
+    if retry_after and retry_after.isdigit():
+        delay = max(delay, min(float(retry_after), ESPN_BACKOFF_MAX_SECONDS))
+    return delay
+
+
+class EspnTransport:
+    """One keep-alive HTTP session every League's ESPN requests go through.
+
+    Connections to a host are pooled and reused across leagues, sessions and
+    threads, so a box score sweep pays TCP and TLS setup once per connection
+    instead of once per request. Responses are asked for gzipped. Cookies are
+    sent per request and the session's own jar refuses every cookie ESPN
+    sets, so one manager's login never leaks into another's requests.
+
+    Every request takes a token from the rate limit and a slot from the
+    adaptive concurrency limit. 429, 5xx and dropped connections are retried
+    with jittered exponential backoff while both the call's attempts and the
+    API request's RetryBudget last; throttling past that raises EspnThrottled.
+    """
+
+    def __init__(self, pool_hosts: int = ESPN_POOL_HOSTS, pool_size: int = ESPN_POOL_SIZE, pool_block: bool = ESPN_POOL_BLOCK,
+                 bucket: TokenBucket = None, limiter: AdaptiveLimiter = None):
+        self.pool_size = pool_size
+        self._adapter = HTTPAdapter(pool_connections=pool_hosts, pool_maxsize=pool_size, pool_block=pool_block)
+        self.session = requests.Session()
+        self.session.mount("https://", self._adapter)
+        self.session.mount("http://", self._adapter)
+        self.session.headers.update({"Accept-Encoding": "gzip, deflate"})
+        self.session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+        self.bucket = bucket or TokenBucket()
+        self.limiter = limiter or AdaptiveLimiter()
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.retries = 0
+        self.throttled = 0
+        self.rate_wait_seconds = 0.0
+
+    def _send(self, url: str, params: dict = None, headers: dict = None, cookies: dict = None) -> requests.Response:
+        waited = self.bucket.take()
+        acquired_at = self.limiter.acquire()
+        throttled = True
+        try:
+            response = self.session.get(url, params=params, headers=headers, cookies=cookies)
+            throttled = response.status_code in RETRY_STATUSES
+            return response
+        finally:
+            self.limiter.release(acquired_at, throttled)
+            with self._lock:
+                self.requests += 1
+                self.rate_wait_seconds += waited
+                self.throttled += throttled
+
+    def _may_retry(self, attempt: int, reason: str) -> bool:
+        if attempt >= ESPN_RETRY_ATTEMPTS:
+            return False
+        budget = current_retry_budget.get()
+        if budget is not None and not budget.spend():
+            espn_retries.inc(reason="budget_exhausted")
+            return False
+        espn_retries.inc(reason=reason)
+        with self._lock:
+            self.retries += 1
+        return True
+
+    def get(self, url: str, params: dict = None, headers: dict = None, cookies: dict = None) -> requests.Response:
+        budget = current_retry_budget.get()
+        if budget is not None:
+            budget.earn()
+        attempt = 0
+        while True:
+            try:
+                response = self._send(url, params=params, headers=headers, cookies=cookies)
+            except (requests.ConnectionError, requests.Timeout):
+                if not self._may_retry(attempt, "connection"):
+                    raise
+                time.sleep(_backoff(attempt))
+                attempt += 1
+                continue
+
+            if response.status_code not in RETRY_STATUSES:
+                return response
+            if not self._may_retry(attempt, str(response.status_code)):
+                retry_after = response.headers.get("Retry-After", "")
+                raise EspnThrottled(response.status_code, float(retry_after) if retry_after.isdigit() else ESPN_BACKOFF_MAX_SECONDS)
+            time.sleep(_backoff(attempt, response))
+            attempt += 1
+
+    def stats(self) -> dict:
+        """Requests and new connections by host, every request past the first on a connection reused one"""
+        hosts = {}
+        pools = self._adapter.poolmanager.pools
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            host = hosts.setdefault(f"{pool.scheme}://{pool.host}:{pool.port}", {"connections": 0, "requests": 0})
+            host["connections"] += pool.num_connections
+            host["requests"] += pool.num_requests
+        connections = sum(host["connections"] for host in hosts.values())
+        pooled = sum(host["requests"] for host in hosts.values())
+        with self._lock:
+            counts = {"requests": self.requests, "retries": self.retries, "throttled": self.throttled,
+                      "rate_wait_seconds": round(self.rate_wait_seconds, 3)}
+        return {
+            **counts,
+            "connections_opened": connections,
+            "connection_reuse": round(1 - connections / pooled, 3) if pooled else None,
+            "pool_size": self.pool_size,
+            "concurrency_limit": int(self.limiter.limit),
+            "concurrency_decreases": self.limiter.decreases,
+            "in_flight": self.limiter.in_flight,
+            "hosts": hosts,
+        }
+
+
+# every CachedEspnRequests in the process sends through this
+espn_transport = EspnTransport()
@@ -0,0 +1,173 @@
+"""Benchmarks every Services stat and the full wrapped report against the ESPN stand-in.
+
+Each stat runs on a fresh Services with a cold box score cache, so its numbers
+are what a manager's first request for it costs. For every league size the
+suite records wall time, upstream ESPN calls and peak Python memory:
+
+    python -m bench.benchmark --save bench/baseline.json
+    python -m bench.benchmark --compare bench/baseline.json
+
+--compare exits non-zero when a stat makes more upstream calls than the
+baseline, or gets slower by more than --tolerance.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import socket
+import sys
+import threading
+import time
+import tracemalloc
+
+import uvicorn
+
+from bench.standin import create_app
+from bench.synthetic import swid
+
+LEAGUE_SIZES = (8, 12, 20)
+YEAR = 2025
+
+STATS = (
+    "find_trae_young", "get_weekly_average", "get_best_week", "get_worst_week", "get_longest_streak",
+    "get_sleeper_star", "get_bust", "find_clutch_player", "find_best_team_matchup", "find_worst_team_matchup",
+    "get_biggest_comeback", "get_biggest_blown_lead", "get_lead_changes", "bonus_title", "missing_points",
+    "get_lineup_report", "wrapped",
+)
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_standin(latency_ms: float, jitter_ms: float, seed: int, sizes) -> tuple[object, str]:
+    """Run the stand-in on a background thread, every league id is also its team count"""
+    standin = create_app(seed=seed, latency_ms=latency_ms, jitter_ms=jitter_ms,
+                         league_sizes={size: size for size in sizes})
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(standin, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return standin, f"http://127.0.0.1:{port}"
+
+
+def measure(standin, func, repeat: int) -> dict:
+    """Best wall time over repeat cold runs, upstream calls of the first and peak memory of one more traced run"""
+    seconds = []
+    calls = None
+    for _ in range(repeat):
+        before = standin.state.requests
+        started = time.perf_counter()
+        func()
+        seconds.append(time.perf_counter() - started)
+        calls = standin.state.requests - before if calls is None else calls
+
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {"seconds": round(min(seconds), 4), "upstream_calls": calls, "peak_mib": round(peak / 2 ** 20, 2)}
+
+
+def run(latency_ms: float, jitter_ms: float, seed: int, repeat: int, sizes=LEAGUE_SIZES, stats=STATS) -> dict:
+    standin, base_url = start_standin(latency_ms, jitter_ms, seed, sizes)
+    # app modules read their settings on import, so they are only imported once the stand-in is up
+    os.environ["ESPN_BASE_URL"] = base_url
+    os.environ["ESPN_CACHE_PATH"] = ""
+    from app.espn import build_league
+    from app.services import Services
+
+    results = {}
+    for size in sizes:
+        league_id = size
+        timings = {"league_load": measure(standin, lambda: build_league(league_id, YEAR, "benchmark", swid(1)), repeat)}
+        league = build_league(league_id, YEAR, "benchmark", swid(1))
+        for stat in stats:
+            def cold():
+                services = Services(league_id, YEAR, "benchmark", swid(1), league_instance=league)
+                return getattr(services, stat)()
+            timings[stat] = measure(standin, cold, repeat)
+            print(f"{size:>3} teams  {stat:<24} {timings[stat]['seconds']:>8.3f}s "
+                  f"{timings[stat]['upstream_calls']:>5} calls {timings[stat]['peak_mib']:>8.2f} MiB", file=sys.stderr)
+        results[str(size)] = timings
+
+    return {
+        "meta": {
+            "latency_ms": latency_ms,
+            "jitter_ms": jitter_ms,
+            "seed": seed,
+            "repeat": repeat,
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+        },
+        "results": results,
+    }
+
+
+def compare(current: dict, baseline: dict, tolerance: float, min_seconds: float = 0.05) -> list[str]:
+    """Regressions of current against baseline, one line each.
+
+    Stats that stay under min_seconds are too fast for their wall time to say anything and only fail on calls.
+    """
+    regressions = []
+    for size, timings in current["results"].items():
+        for stat, now in timings.items():
+            before = baseline.get("results", {}).get(size, {}).get(stat)
+            if before is None:
+                continue
+            change = (now["seconds"] - before["seconds"]) / before["seconds"] if before["seconds"] else 0
+            print(f"{size:>3} teams  {stat:<24} {before['seconds']:>8.3f}s -> {now['seconds']:>8.3f}s ({change:+.0%})  "
+                  f"calls {before['upstream_calls']} -> {now['upstream_calls']}  "
+                  f"MiB {before['peak_mib']} -> {now['peak_mib']}")
+            if now["upstream_calls"] > before["upstream_calls"]:
+                regressions.append(f"{size} teams {stat}: {before['upstream_calls']} -> {now['upstream_calls']} upstream calls")
+            if change > tolerance and now["seconds"] >= min_seconds:
+                regressions.append(f"{size} teams {stat}: {change:+.0%} wall time")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark every Services stat against the ESPN stand-in")
+    parser.add_argument("--latency-ms", type=float, default=20, help="latency the stand-in adds to each response")
+    parser.add_argument("--jitter-ms", type=float, default=0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=1, help="cold runs per stat, the fastest is kept")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(LEAGUE_SIZES))
+    parser.add_argument("--stat", action="append", help="only run these stats, can be repeated")
+    parser.add_argument("--save", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="baseline JSON file to compare the results against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed wall time slowdown before failing")
+    parser.add_argument("--min-seconds", type=float, default=0.05, help="wall times below this are not compared")
+    args = parser.parse_args()
+
+    current = run(args.latency_ms, args.jitter_ms, args.seed, args.repeat, args.sizes, args.stat or STATS)
+
+    if args.save:
+        with open(args.save, "w") as file:
+            json.dump(current, file, indent=2)
+            file.write("\n")
+
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+        if baseline.get("meta", {}).get("latency_ms") != args.latency_ms:
+            print("warning: baseline was recorded with a different --latency-ms", file=sys.stderr)
+        regressions = compare(current, baseline, args.tolerance, args.min_seconds)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        sys.exit(1 if regressions else 0)
+
+    if not args.save:
+        json.dump(current, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+"""Load test: many managers in many leagues opening their wrapped page at once.
+
+Starts the ESPN stand-in and the app as subprocesses (or targets an app that is
+already running with --target) and replays the frontend's flow for every
+simulated manager: POST /initialize, then every stat route in parallel.
+Reports latency percentiles, throughput and error rate per route:
+
+    python -m bench.loadtest --users 60 --leagues 5 --app-workers 2 --latency-ms 80
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from bench.benchmark import free_port
+from bench.synthetic import swid
+
+YEAR = 2025
+
+# the stat routes the original App.js fetched with Promise.all once /initialize returned
+TEAM_ROUTES = (
+    "/team/find-trae", "/team/weekly-average", "/team/best-week", "/team/worst-week", "/team/longest-streak",
+    "/team/sleeper", "/team/bust", "/team/clutch", "/team/best-matchup", "/team/worst-matchup",
+    "/team/biggest-comeback", "/team/bonus-titles", "/team/missing-points",
+)
+
+FLOWS = {
+    "team": TEAM_ROUTES,
+    "wrapped": ("/wrapped",),
+    # what App.js does today
+    "stream": ("/wrapped/stream",),
+}
+
+
+def percentile(values: list[float], fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+class Recorder:
+    def __init__(self):
+        self.samples = {}
+        self._lock = threading.Lock()
+
+    def record(self, route: str, seconds: float, ok: bool):
+        with self._lock:
+            self.samples.setdefault(route, []).append((seconds, ok))
+
+    def report(self, duration: float) -> dict:
+        report = {}
+        for route, samples in self.samples.items():
+            latencies = [seconds for seconds, _ in samples]
+            errors = sum(1 for _, ok in samples if not ok)
+            report[route] = {
+                "requests": len(samples),
+                "errors": errors,
+                "error_rate": round(errors / len(samples), 4),
+                "throughput_rps": round(len(samples) / duration, 2),
+                "p50_ms": round(percentile(latencies, 0.50) * 1000, 1),
+                "p95_ms": round(percentile(latencies, 0.95) * 1000, 1),
+                "p99_ms": round(percentile(latencies, 0.99) * 1000, 1),
+            }
+        return report
+
+
+def timed(recorder: Recorder, session: requests.Session, method: str, url: str, route: str, **kwargs):
+    started = time.perf_counter()
+    try:
+        response = session.request(method, url, timeout=300, **kwargs)
+        # read the whole body so streamed responses are timed to their last line
+        body = response.content
+        ok = response.status_code == 200
+    except requests.RequestException:
+        body, ok = None, False
+    recorder.record(route, time.perf_counter() - started, ok)
+    return body if ok else None
+
+
+def manager(recorder: Recorder, target: str, league_id: int, team_id: int, routes: tuple[str, ...]):
+    """One manager's page load: initialize, then every stat route at once"""
+    session = requests.Session()
+    body = timed(recorder, session, "POST", f"{target}/initialize", "/initialize",
+                 json={"league_id": league_id, "year": YEAR, "espn_s2": "loadtest", "swid": swid(team_id)})
+    if body is None:
+        return
+    headers = {"Authorization": f"Bearer {json.loads(body)['session_token']}"}
+    with ThreadPoolExecutor(max_workers=len(routes)) as executor:
+        for route in routes:
+            executor.submit(timed, recorder, session, "GET", f"{target}{route}", route, headers=headers)
+
+
+def wait_until_up(url: str, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            requests.get(url, timeout=1)
+            return
+        except requests.RequestException:
+            time.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up within {timeout}s")
+
+
+def start_servers(args) -> tuple[str, list[subprocess.Popen]]:
+    """Stand-in and app in their own processes so the load generator does not share their GIL"""
+    standin_port, app_port = free_port(), free_port()
+    standin = subprocess.Popen([
+        sys.executable, "-m", "bench.standin", "--port", str(standin_port), "--teams", str(args.teams),
+        "--latency-ms", str(args.latency_ms), "--jitter-ms", str(args.jitter_ms),
+        *(["--max-concurrent", str(args.max_concurrent)] if args.max_concurrent else []),
+    ])
+    # a store file of its own, so reports and sessions of an earlier run are never served
+    store_path = os.path.join(tempfile.mkdtemp(prefix="loadtest-"), "shared.sqlite3")
+    env = {**os.environ, "ESPN_BASE_URL": f"http://127.0.0.1:{standin_port}", "ESPN_CACHE_PATH": "",
+           "SHARED_STORE_PATH": store_path}
+    app = subprocess.Popen([
+        sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(app_port),
+        "--workers", str(args.app_workers), "--log-level", "warning",
+    ], env=env)
+    processes = [standin, app]
+    try:
+        wait_until_up(f"http://127.0.0.1:{standin_port}/standin/stats")
+        wait_until_up(f"http://127.0.0.1:{app_port}/")
+    except RuntimeError:
+        for process in processes:
+            process.terminate()
+        raise
+    return f"http://127.0.0.1:{app_port}", processes
+
+
+def run(target: str, users: int, leagues: int, teams: int, ramp_seconds: float, routes: tuple[str, ...]) -> dict:
+    recorder = Recorder()
+    # managers are dealt round robin across leagues, each one owns a different team of theirs
+    plan = [(1000 + user % leagues, user // leagues % teams + 1) for user in range(users)]
+    started = time.perf_counter()
+    threads = []
+    for index, (league_id, team_id) in enumerate(plan):
+        if ramp_seconds:
+            time.sleep(max(0.0, started + ramp_seconds * index / users - time.perf_counter()))
+        thread = threading.Thread(target=manager, args=(recorder, target, league_id, team_id, routes))
+        thread.start()
+        threads.append(thread)
+    for thread in threads:
+        thread.join()
+    duration = time.perf_counter() - started
+    return {"duration_seconds": round(duration, 2), "routes": recorder.report(duration)}
+
+
+def print_report(result: dict):
+    print(f"{'route':<24} {'reqs':>6} {'err%':>6} {'rps':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for route, stats in sorted(result["routes"].items()):
+        print(f"{route:<24} {stats['requests']:>6} {stats['error_rate'] * 100:>5.1f}% {stats['throughput_rps']:>7.2f} "
+              f"{stats['p50_ms']:>9.1f} {stats['p95_ms']:>9.1f} {stats['p99_ms']:>9.1f}")
+    print(f"finished in {result['duration_seconds']}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate managers across leagues loading their wrapped page")
+    parser.add_argument("--users", type=int, default=24, help="managers in total")
+    parser.add_argument("--leagues", type=int, default=2, help="leagues the managers are spread across")
+    parser.add_argument("--teams", type=int, default=12, help="teams per synthetic league")
+    parser.add_argument("--flow", choices=sorted(FLOWS), default="team",
+                        help="team: every /team/* route in parallel, wrapped: /wrapped, stream: /wrapped/stream")
+    parser.add_argument("--ramp-seconds", type=float, default=0, help="spread manager arrivals over this long")
+    parser.add_argument("--target", help="URL of an app that is already running, against its own ESPN backend")
+    parser.add_argument("--app-workers", type=int, default=1, help="uvicorn workers when the harness starts the app")
+    parser.add_argument("--latency-ms", type=float, default=50, help="stand-in latency when the harness starts it")
+    parser.add_argument("--jitter-ms", type=float, default=20)
+    parser.add_argument("--max-concurrent", type=int, default=None,
+                        help="stand-in answers requests past this many in flight with 429, to exercise the rate limiter")
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args()
+
+    if args.users > args.leagues * args.teams:
+        parser.error("more users than teams to go around, raise --leagues or --teams")
+
+    processes = []
+    target = args.target
+    if not target:
+        target, processes = start_servers(args)
+    try:
+        result = run(target, args.users, args.leagues, args.teams, args.ramp_seconds, FLOWS[args.flow])
+    finally:
+        for process in processes:
+            process.terminate()
+            process.wait()
+
+    result["config"] = {key: value for key, value in vars(args).items() if key != "json"}
+    print_report(result)
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(result, file, indent=2)
+            file.write("\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""Local stand-in for the ESPN fantasy basketball API.
+
+Serves the handful of endpoints espn_api's basketball League uses, either by
+replaying responses recorded from ESPN or from a SyntheticLeague, with
+injected latency so caching and parallelism behave like they would against
+the real thing. Point the app at it with ESPN_BASE_URL:
+
+    python -m bench.standin --port 8100 --latency-ms 80 --jitter-ms 40
+    ESPN_BASE_URL=http://127.0.0.1:8100 ESPN_CACHE_PATH= uvicorn app.main:app
+
+--max-concurrent answers requests past that many in flight with a 429, the way
+ESPN throttles a client that pushes too hard.
+
+Synthetic managers log in with espn_s2 set to anything and swid set to
+bench.synthetic.swid(team_id). To record a real league instead, run with
+--record-from https://lm-api-reads.fantasy.espn.com --fixtures DIR, initialize
+the app once with real cookies, then replay it with --fixtures DIR alone.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import random
+
+import requests
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+from bench.synthetic import SyntheticLeague, pro_schedule
+
+
+def fixture_name(path: str, params: list[tuple[str, str]], fantasy_filter: str | None) -> str:
+    """File a response is recorded under, the same request always maps to the same file"""
+    key = json.dumps([path.rstrip('/'), sorted(params), fantasy_filter or ''])
+    return hashlib.sha256(key.encode()).hexdigest()[:24] + '.json'
+
+
+def create_app(teams: int = 12, seed: int = 0, latency_ms: float = 0, jitter_ms: float = 0,
+               fixtures: str = None, record_from: str = None, league_sizes: dict[int, int] = None,
+               current_scoring_period: int = None, max_concurrent: int = None) -> FastAPI:
+    app = FastAPI(title="ESPN stand-in")
+    leagues = {}
+    rng = random.Random(seed)
+    app.state.requests = 0
+    app.state.in_flight = 0
+    app.state.throttled = 0
+
+    def synthetic(league_id: int, year: int) -> SyntheticLeague:
+        if (league_id, year) not in leagues:
+            size = (league_sizes or {}).get(league_id, teams)
+            leagues[league_id, year] = SyntheticLeague(league_id, year, teams=size, seed=seed,
+                                                       current_scoring_period=current_scoring_period)
+        return leagues[league_id, year]
+
+    def generate(year: int, rest: str, views: list[str], params: dict, fantasy_filter: dict):
+        parts = rest.strip('/').split('/')
+        if parts == ['']:
+            if 'proTeamSchedules_wl' in views:
+                return pro_schedule()
+        elif parts == ['players']:
+            # pro players are shared by every league, serve the union of the synthetic ones loaded so far
+            return [player for league in leagues.values() for player in league.pro_players()]
+        elif len(parts) == 4 and parts[:3] == ['segments', '0', 'leagues']:
+            league = synthetic(int(parts[3]), year)
+            if 'mDraftDetail' in views:
+                return league.draft()
+            if 'mMatchupScore' in views:
+                matchup_period = fantasy_filter.get('schedule', {}).get('filterMatchupPeriodIds', {}).get('value', [1])[0]
+                return league.box_scores(int(matchup_period), int(params.get('scoringPeriodId', 1)))
+            return league.league()
+        return None
+
+    @app.get("/apis/v3/games/fba/seasons/{year}{rest:path}")
+    async def espn(year: int, rest: str, request: Request):
+        app.state.requests += 1
+        app.state.in_flight += 1
+        try:
+            if latency_ms or jitter_ms:
+                await asyncio.sleep(max(0.0, latency_ms + rng.uniform(-jitter_ms, jitter_ms)) / 1000)
+            if max_concurrent and app.state.in_flight > max_concurrent:
+                app.state.throttled += 1
+                return JSONResponse({"messages": ["Too Many Requests"]}, status_code=429, headers={"Retry-After": "1"})
+            return await respond(year, rest, request)
+        finally:
+            app.state.in_flight -= 1
+
+    async def respond(year: int, rest: str, request: Request):
+        params = list(request.query_params.multi_items())
+        fantasy_filter = request.headers.get('x-fantasy-filter')
+        name = fixture_name(request.url.path, params, fantasy_filter)
+
+        if record_from:
+            upstream = await asyncio.to_thread(
+                requests.get, record_from.rstrip('/') + request.url.path, params=params,
+                headers={'x-fantasy-filter': fantasy_filter} if fantasy_filter else None, cookies=request.cookies
+            )
+            if upstream.status_code == 200 and fixtures:
+                with open(os.path.join(fixtures, name), 'w') as file:
+                    file.write(upstream.text)
+            return JSONResponse(upstream.json(), status_code=upstream.status_code)
+
+        if fixtures:
+            path = os.path.join(fixtures, name)
+            if not os.path.exists(path):
+                return JSONResponse({"messages": [f"no recorded response for {request.url}"]}, status_code=404)
+            with open(path) as file:
+                return JSONResponse(json.load(file))
+
+        views = [value for key, value in params if key == 'view']
+        body = generate(year, rest, views, dict(params), json.loads(fantasy_filter) if fantasy_filter else {})
+        if body is None:
+            return JSONResponse({"messages": [f"not served by the stand-in: {request.url.path}"]}, status_code=404)
+        return JSONResponse(body)
+
+    @app.get("/standin/stats")
+    async def stats():
+        return {"requests": app.state.requests, "throttled": app.state.throttled}
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve recorded or synthetic ESPN fantasy basketball responses")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--teams", type=int, default=12, help="teams in every synthetic league")
+    parser.add_argument("--league-size", action="append", default=[], metavar="LEAGUE_ID=TEAMS",
+                        help="team count for one synthetic league, can be repeated")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--current-scoring-period", type=int, default=None,
+                        help="first scoring period not yet played, defaults to a finished season")
+    parser.add_argument("--latency-ms", type=float, default=0, help="delay added to every response")
+    parser.add_argument("--jitter-ms", type=float, default=0, help="random +/- spread around --latency-ms")
+    parser.add_argument("--max-concurrent", type=int, default=None, help="answer requests past this many in flight with 429")
+    parser.add_argument("--fixtures", default=None, help="directory of recorded responses to replay or record into")
+    parser.add_argument("--record-from", default=None, help="forward to this ESPN host and record into --fixtures")
+    args = parser.parse_args()
+
+    if args.fixtures:
+        os.makedirs(args.fixtures, exist_ok=True)
+    league_sizes = {int(league_id): int(size) for league_id, size in (item.split('=') for item in args.league_size)}
+
+    import uvicorn
+    uvicorn.run(create_app(args.teams, args.seed, args.latency_ms, args.jitter_ms, args.fixtures, args.record_from,
+                           league_sizes, args.current_scoring_period, args.max_concurrent),
+                host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,268 @@
+from __future__ import annotations
+
+import random
+
+from espn_api.basketball.constant import POSITION_MAP
+
+# days in each regular season matchup period, the two week one is the all star break
+MATCHUP_LENGTHS = [6] + [7] * 16 + [14] + [7] * 2
+
+# starting slots filled in this order when a manager sets a lineup
+STARTING_SLOTS = ['PG', 'SG', 'SF', 'PF', 'C', 'G', 'F', 'UT', 'UT', 'UT']
+BENCH_SIZE = 3
+
+ELIGIBLE_SLOTS = {
+    'PG': ['PG', 'G', 'UT', 'BE', 'IR'],
+    'SG': ['SG', 'G', 'SG/SF', 'G/F', 'UT', 'BE', 'IR'],
+    'SF': ['SF', 'F', 'SG/SF', 'G/F', 'UT', 'BE', 'IR'],
+    'PF': ['PF', 'F', 'PF/C', 'F/C', 'UT', 'BE', 'IR'],
+    'C': ['C', 'PF/C', 'F/C', 'UT', 'BE', 'IR'],
+}
+
+
+def swid(team_id: int) -> str:
+    """SWID cookie of the synthetic manager who owns team_id"""
+    return '{00000000-0000-0000-0000-%012d}' % team_id
+
+
+def pro_schedule() -> dict:
+    """proTeamSchedules_wl view, synthetic players have no NBA schedule to look up"""
+    return {"settings": {"proTeams": [{"id": team_id, "proGamesByScoringPeriod": {}} for team_id in range(31)]}}
+
+
+def round_robin(team_ids: list[int], week: int) -> list[tuple[int, int | None]]:
+    """(home, away) pairs for one week using the circle method, away is None on a bye"""
+    teams = list(team_ids) + ([None] if len(team_ids) % 2 else [])
+    rounds = len(teams) - 1
+    rotation = week % rounds
+    circle = [teams[0]] + teams[1:][-rotation:] + teams[1:][:-rotation] if rotation else teams
+    pairs = []
+    for index in range(len(circle) // 2):
+        home, away = circle[index], circle[-1 - index]
+        if home is None:
+            home, away = away, home
+        pairs.append((home, away))
+    return pairs
+
+
+class SyntheticLeague:
+    """A points league with a full regular season, shaped like the ESPN fantasy API's responses.
+
+    Everything is generated up front from seed, so the same arguments always
+    produce byte for byte the same payloads. Scoring periods at or after
+    current_scoring_period have not been played yet; by default the season is
+    over.
+    """
+
+    def __init__(self, league_id: int, year: int, teams: int = 12, seed: int = 0, current_scoring_period: int = None):
+        self.league_id = league_id
+        self.year = year
+        self.rng = random.Random(f"{seed}-{league_id}-{year}-{teams}")
+
+        self.days_by_matchup = {}
+        day = 1
+        for matchup_period, length in enumerate(MATCHUP_LENGTHS, start=1):
+            self.days_by_matchup[matchup_period] = list(range(day, day + length))
+            day += length
+        self.final_scoring_period = day - 1
+        self.current_scoring_period = current_scoring_period or self.final_scoring_period + 1
+
+        self.team_ids = list(range(1, teams + 1))
+        self.players = {}
+        self.rosters = {}
+        for team_id in self.team_ids:
+            self.rosters[team_id] = [self._new_player(team_id, index) for index in range(len(STARTING_SLOTS) + BENCH_SIZE)]
+
+        # team_id -> scoring period -> [(player id, lineup slot, points)]
+        self.lineups = {team_id: {} for team_id in self.team_ids}
+        for team_id in self.team_ids:
+            for scoring_period in range(1, min(self.current_scoring_period, self.final_scoring_period + 1)):
+                self.lineups[team_id][scoring_period] = self._play_day(team_id)
+
+        self.schedule = []
+        for matchup_period, days in self.days_by_matchup.items():
+            for home, away in round_robin(self.team_ids, matchup_period - 1):
+                self.schedule.append(self._matchup(len(self.schedule) + 1, matchup_period, days, home, away))
+
+    def _new_player(self, team_id: int, index: int) -> dict:
+        player_id = 1000 * team_id + index
+        position = self.rng.choice(list(ELIGIBLE_SLOTS))
+        average = self.rng.uniform(12, 50)
+        player = {
+            "id": player_id,
+            "name": f"Player {player_id}",
+            "position": position,
+            "average": average,
+            # projections miss by up to a quarter either way so every roster has a sleeper and a bust
+            "projected": average * self.rng.uniform(0.75, 1.25),
+            "pro_team": self.rng.randint(1, 30),
+            "games": 0,
+            "points": 0.0,
+        }
+        self.players[player_id] = player
+        return player
+
+    def _play_day(self, team_id: int) -> list[tuple[int, str, float]]:
+        roster = self.rosters[team_id]
+        # managers start their best players most days, and get it wrong on the rest
+        order = sorted(roster, key=lambda player: player["average"] + self.rng.gauss(0, 8), reverse=True)
+        open_slots = list(STARTING_SLOTS)
+        lineup = []
+        for player in order:
+            slot = next((slot for slot in open_slots if slot in ELIGIBLE_SLOTS[player["position"]]), 'BE')
+            if slot != 'BE':
+                open_slots.remove(slot)
+            points = 0.0
+            if self.rng.random() < 0.45:
+                points = round(max(0.0, self.rng.gauss(player["average"], player["average"] * 0.3)), 1)
+                player["games"] += 1
+                player["points"] += points
+            lineup.append((player["id"], slot, points))
+        return lineup
+
+    def day_score(self, team_id: int, scoring_period: int) -> float:
+        lineup = self.lineups[team_id].get(scoring_period, [])
+        return round(sum(points for _, slot, points in lineup if slot not in ('BE', 'IR')), 1)
+
+    def _matchup(self, matchup_id: int, matchup_period: int, days: list[int], home: int, away: int | None) -> dict:
+        matchup = {"id": matchup_id, "matchupPeriodId": matchup_period, "home": self._side(home, days)}
+        if away is None:
+            matchup["winner"] = "UNDECIDED"
+            return matchup
+        matchup["away"] = self._side(away, days)
+        finished = days[-1] < self.current_scoring_period
+        home_points, away_points = matchup["home"]["totalPoints"], matchup["away"]["totalPoints"]
+        matchup["winner"] = ("UNDECIDED" if not finished else "HOME" if home_points > away_points
+                             else "AWAY" if away_points > home_points else "TIE")
+        return matchup
+
+    def _side(self, team_id: int, days: list[int]) -> dict:
+        by_day = {str(day): self.day_score(team_id, day) for day in days if day < self.current_scoring_period}
+        return {"teamId": team_id, "totalPoints": round(sum(by_day.values()), 1), "pointsByScoringPeriod": by_day}
+
+    def _player_json(self, player: dict, day_points: tuple[int, float] = None) -> dict:
+        games = max(player["games"], 1)
+        stats = [
+            {"id": f"00{self.year}", "seasonId": self.year, "scoringPeriodId": 0,
+             "appliedTotal": round(player["points"], 1), "appliedAverage": player["points"] / games},
+            {"id": f"10{self.year}", "seasonId": self.year, "scoringPeriodId": 0,
+             "appliedTotal": round(player["projected"] * 70, 1), "appliedAverage": player["projected"]},
+        ]
+        if day_points is not None:
+            scoring_period, points = day_points
+            stats.append({"id": f"05{self.year}", "seasonId": self.year, "scoringPeriodId": scoring_period,
+                          "appliedTotal": points})
+        return {
+            "id": player["id"],
+            "fullName": player["name"],
+            "defaultPositionId": POSITION_MAP[player["position"]] + 1,
+            "eligibleSlots": [POSITION_MAP[slot] for slot in ELIGIBLE_SLOTS[player["position"]]],
+            "proTeamId": player["pro_team"],
+            "injuryStatus": "ACTIVE",
+            "stats": stats,
+        }
+
+    def _entry(self, player: dict, slot: str, day_points: tuple[int, float] = None) -> dict:
+        return {
+            "playerId": player["id"],
+            "lineupSlotId": POSITION_MAP[slot],
+            "acquisitionType": "DRAFT",
+            "playerPoolEntry": {"id": player["id"], "player": self._player_json(player, day_points)},
+        }
+
+    def _team_json(self, team_id: int) -> dict:
+        matchups = [m for m in self.schedule if "away" in m and m["winner"] != "UNDECIDED"
+                    and team_id in (m["home"]["teamId"], m["away"]["teamId"])]
+        won = lost = tied = 0
+        points_for = points_against = 0.0
+        for matchup in matchups:
+            side, other = ("home", "away") if matchup["home"]["teamId"] == team_id else ("away", "home")
+            points_for += matchup[side]["totalPoints"]
+            points_against += matchup[other]["totalPoints"]
+            won += matchup["winner"] == side.upper()
+            lost += matchup["winner"] == other.upper()
+            tied += matchup["winner"] == "TIE"
+        slots = STARTING_SLOTS + ['BE'] * BENCH_SIZE
+        return {
+            "id": team_id,
+            "abbrev": f"T{team_id}",
+            "name": f"Team {team_id}",
+            "divisionId": 0,
+            "owners": [swid(team_id)],
+            "playoffSeed": team_id,
+            "rankCalculatedFinal": 0,
+            "record": {"overall": {"wins": won, "losses": lost, "ties": tied,
+                                   "pointsFor": round(points_for, 1), "pointsAgainst": round(points_against, 1)}},
+            "roster": {"entries": [self._entry(player, slot) for player, slot in zip(self.rosters[team_id], slots)]},
+        }
+
+    def league(self) -> dict:
+        """mTeam, mRoster, mMatchup, mSettings and mStandings views in one payload"""
+        current_matchup = next((period for period, days in self.days_by_matchup.items()
+                                if self.current_scoring_period <= days[-1]), len(MATCHUP_LENGTHS))
+        return {
+            "id": self.league_id,
+            "seasonId": self.year,
+            "scoringPeriodId": self.current_scoring_period,
+            "status": {
+                "currentMatchupPeriod": current_matchup,
+                "firstScoringPeriod": 1,
+                "finalScoringPeriod": self.final_scoring_period,
+                "previousSeasons": [],
+            },
+            "settings": {
+                "name": f"Synthetic League {self.league_id}",
+                "size": len(self.team_ids),
+                "scheduleSettings": {
+                    "matchupPeriodCount": len(MATCHUP_LENGTHS),
+                    "matchupPeriods": {str(period): [period] for period in self.days_by_matchup},
+                    "playoffTeamCount": min(6, len(self.team_ids)),
+                    "playoffSeedingRule": "TOTAL_H2H_WINS",
+                    "divisions": [{"id": 0, "name": "League"}],
+                },
+                "tradeSettings": {"vetoVotesRequired": 4},
+                "draftSettings": {"keeperCount": 0},
+                "scoringSettings": {"matchupTieRule": "NONE", "playoffMatchupTieRule": "NONE", "scoringType": "H2H_POINTS"},
+                "acquisitionSettings": {"isUsingAcquisitionBudget": False},
+                "rosterSettings": {"lineupSlotCounts": {
+                    str(POSITION_MAP[slot]): STARTING_SLOTS.count(slot) if slot in STARTING_SLOTS else BENCH_SIZE
+                    for slot in dict.fromkeys(STARTING_SLOTS + ['BE'])
+                }},
+            },
+            "members": [{"id": swid(team_id), "displayName": f"manager{team_id}"} for team_id in self.team_ids],
+            "teams": [self._team_json(team_id) for team_id in self.team_ids],
+            "schedule": self.schedule,
+        }
+
+    def draft(self) -> dict:
+        return {"draftDetail": {"drafted": False, "picks": []}}
+
+    def pro_players(self) -> list[dict]:
+        return [{"id": player["id"], "fullName": player["name"]} for player in self.players.values()]
+
+    def box_scores(self, matchup_period: int, scoring_period: int) -> dict:
+        """mMatchupScore and mScoreboard views for one scoring period of one matchup period"""
+        schedule = []
+        for matchup in self.schedule:
+            if matchup["matchupPeriodId"] != matchup_period:
+                continue
+            box_score = {key: value for key, value in matchup.items() if key not in ("home", "away")}
+            for side in ("home", "away"):
+                if side not in matchup:
+                    continue
+                team_id = matchup[side]["teamId"]
+                lineup = self.lineups[team_id].get(scoring_period)
+                if lineup is None:
+                    # days outside the played season still list the roster, nobody has points
+                    slots = STARTING_SLOTS + ['BE'] * BENCH_SIZE
+                    lineup = [(player["id"], slot, 0.0) for player, slot in zip(self.rosters[team_id], slots)]
+                box_score[side] = {
+                    **matchup[side],
+                    "rosterForCurrentScoringPeriod": {
+                        "appliedStatTotal": self.day_score(team_id, scoring_period),
+                        "entries": [self._entry(self.players[player_id], slot, (scoring_period, points))
+                                    for player_id, slot, points in lineup],
+                    },
+                }
+            schedule.append(box_score)
+        return {"id": self.league_id, "seasonId": self.year, "scoringPeriodId": scoring_period, "schedule": schedule}
@@ -35,57 +35,70 @@ const FantasyBasketballWrapped = () => {
     'participation trophy': 'Uh, at least you showed up and had fun!'
   };
 
-  const fetchStat = async (endpoint) => {
-    try {
-      const response = await fetch(`${API_BASE}${endpoint}`);
-      if (!response.ok) throw new Error(`Failed to fetch ${endpoint}`);
-      return await response.text();
-    } catch (err) {
-      console.error(`Error fetching ${endpoint}:`, err);
-      return 'Error loading data';
+  // Turn a structured /wrapped stat into the "Label: value, ..." text the pages render
+  const describeStat = (stat, labels) => {
+    if (stat === null || stat === undefined) return 'Error loading data';
+    if (typeof stat !== 'object') return String(stat);
+    if (typeof labels === 'function') return labels(stat);
+    return Object.entries(labels)
+      .map(([key, label]) => `${label}: ${stat[key]}`)
+      .join(', ');
+  };
+
+  // How each /wrapped stat maps onto the page state and its display labels
+  const statDisplay = {
+    trae: ['trae'],
+    weekly_average: ['weeklyAverage'],
+    best_week: ['bestWeek', { week: 'Week', score: 'Score' }],
+    worst_week: ['worstWeek', { week: 'Week', score: 'Score' }],
+    longest_streak: ['longestStreak', { wins: 'Longest Win Streak', losses: 'Longest Loss Streak' }],
+    sleeper: ['sleeper', { name: 'Name', average: 'Average', projected: 'Projected' }],
+    bust: ['bust', { name: 'Name', average: 'Average', projected: 'Projected' }],
+    clutch: ['clutch'],
+    // same text as /team/best-matchup and /team/worst-matchup, which count the other side out of 4
+    best_matchup: ['bestMatchup', ({ team, wins }) => `Team: ${team}, Wins: ${wins}, Losses: ${4 - wins}`],
+    worst_matchup: ['worstMatchup', ({ team, losses }) => `Team: ${team}, Wins: ${4 - losses}, Losses: ${losses}`],
+    biggest_comeback: ['biggestComeback', { week: 'Week', opponent: 'Opponent', deficit: 'Deficit' }],
+    missing_points: ['missingPoints']
+  };
+
+  const applyStat = ({ stat, value, error }) => {
+    if (stat === 'bonus_titles') {
+      setStats(prev => ({ ...prev, bonusTitles: error ? 'Error loading data' : (value || []).join(', ') }));
+      return;
     }
+    if (!statDisplay[stat]) return;
+    const [key, labels] = statDisplay[stat];
+    setStats(prev => ({ ...prev, [key]: error ? 'Error loading data' : describeStat(value, labels) }));
   };
 
-  const loadAllStats = async () => {
+  const loadAllStats = async (sessionToken) => {
     setLoading(true);
-    const endpoints = [
-      '/team/find-trae',
-      '/team/weekly-average',
-      '/team/best-week',
-      '/team/worst-week',
-      '/team/longest-streak',
-      '/team/sleeper',
-      '/team/bust',
-      '/team/clutch',
-      '/team/best-matchup',
-      '/team/worst-matchup',
-      '/team/biggest-comeback',
-      '/team/bonus-titles',
-      '/team/missing-points'
-    ];
+    setStats({});
 
     try {
-      const results = await Promise.all(
-        endpoints.map(endpoint => fetchStat(endpoint))
-      );
-      
-      const statsData = {
-        trae: results[0],
-        weeklyAverage: results[1],
-        bestWeek: results[2],
-        worstWeek: results[3],
-        longestStreak: results[4],
-        sleeper: results[5],
-        bust: results[6],
-        clutch: results[7],
-        bestMatchup: results[8],
-        worstMatchup: results[9],
-        biggestComeback: results[10],
-        bonusTitles: results[11],
-        missingPoints: results[12]
-      };
-      
-      setStats(statsData);
+      // Stats arrive one JSON line at a time, the quick ones first, so pages fill in as they are ready
+      const response = await fetch(`${API_BASE}/wrapped/stream`, {
+        headers: { 'Authorization': `Bearer ${sessionToken}` },
+      });
+      if (!response.ok) throw new Error('Failed to fetch /wrapped/stream');
+
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = '';
+      let first = true;
+      while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        const lines = buffer.split('\n');
+        buffer = lines.pop();
+        lines.filter(line => line.trim()).forEach(line => applyStat(JSON.parse(line)));
+        if (first) {
+          first = false;
+          setLoading(false);
+        }
+      }
     } catch (err) {
       setError('Failed to load stats: ' + err.message);
     } finally {
@@ -125,8 +138,9 @@ const FantasyBasketballWrapped = () => {
         throw new Error(errorData.detail || 'Failed to initialize. Please check your credentials.');
       }
 
+      const { session_token } = await response.json();
       setIsInitialized(true);
-      await loadAllStats();
+      await loadAllStats(session_token);
     } catch (err) {
       setError(err.message);
     } finally {
@@ -452,7 +466,7 @@ const FantasyBasketballWrapped = () => {
           </div>
           <div className="text-2xl text-white/80 mb-8">points on the bench</div>
           <p className="text-xl text-white/80 max-w-2xl mx-auto">
-            These are the points you left on your bench when you had empty lineup spots. 
+            These are the points your best possible lineup would have scored on top of the one you set. 
             Setting your lineup is crucial!
           </p>
         </div>
@@ -0,0 +1,142 @@
+"""Heavy stats run on the services executor, so the event loop keeps answering while one is computing."""
+import os
+import socket
+import threading
+import time
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+# app modules read their settings on import: keep sessions and ESPN responses in memory and
+# send ESPN traffic to the stand-in the engine backed test starts on this port
+STANDIN_PORT = free_port()
+os.environ["SHARED_STORE_PATH"] = ""
+os.environ["ESPN_CACHE_PATH"] = ""
+os.environ["ESPN_BASE_URL"] = f"http://127.0.0.1:{STANDIN_PORT}"
+
+import pytest
+import requests
+import uvicorn
+
+from app.main import app
+from app.routes import sessions
+from bench.standin import create_app
+from bench.synthetic import swid
+
+STAT_SECONDS = 2
+YEAR = 2025
+
+
+class SlowServices:
+    """Stands in for Services with a clutch stat that blocks like a cold box score sweep"""
+
+    engine = None
+
+    def find_clutch_player(self):
+        time.sleep(STAT_SECONDS)
+        return "Player 1"
+
+    def approx_size(self):
+        return 0
+
+
+def serve(asgi_app, port: int = None) -> uvicorn.Server:
+    """Run an app on a background thread and wait until it accepts requests"""
+    server = uvicorn.Server(uvicorn.Config(asgi_app, host="127.0.0.1", port=port or free_port(), log_level="warning"))
+    server.thread = threading.Thread(target=server.run, daemon=True)
+    server.thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+def stop(server: uvicorn.Server):
+    server.should_exit = True
+    server.thread.join()
+
+
+def root_seconds(base: str) -> float:
+    started = time.perf_counter()
+    root = requests.get(f"{base}/", timeout=STAT_SECONDS)
+    elapsed = time.perf_counter() - started
+    assert root.status_code == 200
+    assert root.json() == {"message": "Welcome to Fantasy Wrapped!"}
+    return elapsed
+
+
+@pytest.fixture(scope="module")
+def base():
+    # one app server for the module, stopping it shuts the services executor down for good
+    server = serve(app)
+    yield f"http://127.0.0.1:{server.config.port}"
+    stop(server)
+
+
+def test_root_answers_while_heavy_stat_computes(base):
+    token = sessions.create(SlowServices())
+
+    try:
+        heavy = {}
+
+        def call_clutch():
+            heavy["response"] = requests.get(f"{base}/team/clutch", headers={"Authorization": f"Bearer {token}"})
+
+        clutch = threading.Thread(target=call_clutch)
+        clutch.start()
+        # let the stat start blocking its executor thread
+        time.sleep(0.3)
+
+        assert root_seconds(base) < 0.5
+        assert clutch.is_alive(), "the heavy stat should still be computing"
+
+        clutch.join()
+        assert heavy["response"].status_code == 200
+        assert heavy["response"].json() == "Player 1"
+    finally:
+        sessions.delete(token)
+
+
+def test_root_answers_while_league_sweep_is_shared(base):
+    # every box score takes 100ms, so the comeback's season sweep runs for several seconds
+    standin = serve(create_app(teams=8, latency_ms=100), STANDIN_PORT)
+    tokens = []
+
+    try:
+        for team_id in (1, 2):
+            response = requests.post(f"{base}/initialize", json={"league_id": 8, "year": YEAR, "espn_s2": "test",
+                                                                 "swid": swid(team_id)})
+            assert response.status_code == 200
+            tokens.append(response.json()["session_token"])
+        first, second = ({"Authorization": f"Bearer {token}"} for token in tokens)
+
+        responses = {}
+
+        def call(name, route, headers):
+            responses[name] = requests.get(f"{base}{route}", headers=headers)
+
+        comeback = threading.Thread(target=call, args=("comeback", "/team/biggest-comeback", first))
+        comeback.start()
+        time.sleep(0.3)
+        # both need the league's derived values while the comeback is still building the daily index
+        others = [threading.Thread(target=call, args=("titles", "/team/bonus-titles", second)),
+                  threading.Thread(target=call, args=("stream", "/wrapped/stream", second))]
+        for thread in others:
+            thread.start()
+        time.sleep(0.3)
+
+        assert root_seconds(base) < 0.5
+        assert comeback.is_alive(), "the comeback should still be sweeping box scores"
+
+        for thread in [comeback, *others]:
+            thread.join()
+        assert all(response.status_code == 200 for response in responses.values())
+        assert responses["comeback"].json().startswith("Week: ")
+        assert '"stat": "biggest_comeback"' in responses["stream"].text
+    finally:
+        for token in tokens:
+            sessions.delete(token)
+        stop(standin)
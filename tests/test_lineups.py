@@ -0,0 +1,42 @@
+"""optimal_points against every legal lineup worked out by brute force."""
+import itertools
+import random
+
+from app.lineups import optimal_points
+
+
+def brute_force(players: list[tuple[float, list[int]]], slot_count: int) -> float:
+    best = 0.0
+    # every player either sits or takes one of their slots, no slot taken twice
+    for choice in itertools.product(*[[None, *slots] for _, slots in players]):
+        taken = [slot for slot in choice if slot is not None]
+        if len(taken) == len(set(taken)):
+            best = max(best, sum(points for (points, _), slot in zip(players, choice) if slot is not None))
+    return best
+
+
+def test_cross_eligible_players_compete_for_one_utility_slot():
+    # slots: 0 PG, 1 SG, 2 UT. The 30 takes PG first and has to move to UT for the 25, the 12 loses out on UT
+    players = [(30.0, [0, 2]), (25.0, [0]), (20.0, [1, 2]), (12.0, [2])]
+    assert optimal_points(players, 3) == brute_force(players, 3) == 30 + 25 + 20
+
+
+def test_greedy_without_moving_earlier_picks_would_fall_short():
+    # keeping the 10 in slot 0, where it went first, would leave the 9 nowhere to go
+    players = [(10.0, [0, 1]), (9.0, [0]), (1.0, [1])]
+    assert optimal_points(players, 2) == brute_force(players, 2) == 19
+
+
+def test_negative_and_ineligible_players_are_benched():
+    players = [(-5.0, [0]), (7.0, []), (3.0, [0, 1])]
+    assert optimal_points(players, 2) == brute_force(players, 2) == 3
+    assert optimal_points([], 3) == 0
+
+
+def test_random_lineups_match_brute_force():
+    rng = random.Random(0)
+    for _ in range(300):
+        slot_count = rng.randint(1, 4)
+        players = [(float(rng.randint(-3, 20)), rng.sample(range(slot_count), rng.randint(0, slot_count)))
+                   for _ in range(rng.randint(0, 6))]
+        assert optimal_points(players, slot_count) == brute_force(players, slot_count), players
@@ -0,0 +1,84 @@
+"""Vectorised schedule stats against the loops they replaced."""
+from types import SimpleNamespace
+
+import numpy as np
+
+from app.matrix import DailyScoreIndex, ScoreMatrix, longest_runs
+
+
+def longest_run_loop(row) -> int:
+    longest = current = 0
+    for value in row:
+        current = current + 1 if value else 0
+        longest = max(longest, current)
+    return longest
+
+
+def test_longest_runs_matches_loop():
+    rng = np.random.default_rng(0)
+    for _ in range(200):
+        mask = rng.random((rng.integers(1, 5), rng.integers(1, 12))) < rng.random()
+        assert longest_runs(mask).tolist() == [longest_run_loop(row) for row in mask]
+
+
+def test_longest_runs_edges():
+    mask = np.array([[False] * 5, [True] * 5, [True, False, True, True, False]])
+    assert longest_runs(mask).tolist() == [0, 5, 2]
+    assert longest_runs(np.zeros((3, 0), dtype=bool)).tolist() == [0, 0, 0]
+
+
+def two_team_index(daily_home: np.ndarray, daily_away: np.ndarray, has_day: np.ndarray) -> tuple[DailyScoreIndex, object]:
+    """DailyScoreIndex of two teams playing each other every week, home scoring daily_home[week, day]"""
+    home, away = SimpleNamespace(team_id=1), SimpleNamespace(team_id=2)
+    weeks, days = daily_home.shape
+    schedule = [SimpleNamespace(home_team=home, away_team=away, home_final_score=daily_home[week].sum(),
+                                away_final_score=daily_away[week].sum(), winner='UNDECIDED') for week in range(weeks)]
+    home.schedule = away.schedule = schedule
+    matrix = ScoreMatrix(SimpleNamespace(teams=[home, away]))
+    days_by_week = [[(week + 1, week * days + day + 1) for day in range(days)] for week in range(weeks)]
+    box_scores = {
+        days_by_week[week][day]: [SimpleNamespace(home_team=home, away_team=away, home_score=daily_home[week, day],
+                                                  away_score=daily_away[week, day])]
+        for week in range(weeks) for day in range(days) if has_day[week, day]
+    }
+    return DailyScoreIndex(matrix, days_by_week, box_scores), home
+
+
+def lead_changes_loop(daily_home, daily_away, has_day) -> int:
+    changes = 0
+    for week in range(daily_home.shape[0]):
+        lead = 0
+        last_sign = 0
+        for day in range(daily_home.shape[1]):
+            if not has_day[week, day]:
+                continue
+            lead += daily_home[week, day] - daily_away[week, day]
+            sign = np.sign(lead)
+            if sign == 0:
+                continue
+            if last_sign and sign != last_sign:
+                changes += 1
+            last_sign = sign
+    return changes
+
+
+def test_tie_between_flips_is_one_change():
+    # lead goes +2, 0, -1, 0, +3: two changes, the ties in between do not count on their own
+    daily_home = np.array([[2, 0, 0, 4, 3]], dtype=float)
+    daily_away = np.array([[0, 2, 1, 3, 0]], dtype=float)
+    has_day = np.ones((1, 5), dtype=bool)
+    index, home = two_team_index(daily_home, daily_away, has_day)
+    assert index.lead_changes(home) == lead_changes_loop(daily_home, daily_away, has_day) == 2
+
+
+def test_lead_changes_matches_loop():
+    rng = np.random.default_rng(1)
+    for _ in range(200):
+        shape = (rng.integers(1, 4), rng.integers(1, 8))
+        # small integer scores so ties are common
+        daily_home = rng.integers(0, 4, shape).astype(float)
+        daily_away = rng.integers(0, 4, shape).astype(float)
+        # days without a box score yet sit at the end of a week
+        has_day = np.arange(shape[1]) < rng.integers(0, shape[1] + 1, (shape[0], 1))
+        index, home = two_team_index(daily_home, daily_away, has_day)
+        assert index.lead_changes(home) == lead_changes_loop(daily_home, daily_away, has_day)